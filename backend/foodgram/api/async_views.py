@@ -0,0 +1,74 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# Маршруты чтения, которые под ASGI обслуживаются асинхронно.
+ASYNC_ROUTES = {
+    'recipes-list',
+    'recipes-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'tags-list',
+    'tags-detail',
+    'users_subscriptions-list',
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS,
+    thread_name_prefix='async-view'
+)
+
+
+def run_view(view, request, *args, **kwargs):
+    """ Выполняет синхронное представление в потоке пула.
+
+    Ответ рендерится здесь же, а не в общем потоке обработчика ASGI.
+    Соединения с базой у потоков пула свои, поэтому устаревшие
+    закрываются до и после запроса, как это делает Django для своих.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """ Асинхронная обертка над представлением DRF.
+
+    Под ASGI Django выполняет синхронные представления по одному в
+    общем потоке, и медленный запрос к базе задерживает все остальные.
+    Здесь каждый запрос занимает свой поток пула из ASYNC_VIEW_THREADS,
+    а цикл событий свободен, пока база отвечает. Атрибуты представления
+    (csrf_exempt и т.п.) сохраняются.
+    """
+    run = sync_to_async(
+        functools.partial(run_view, view),
+        thread_sensitive=False,
+        executor=executor
+    )
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_routes(patterns):
+    """ Заменяет обработчики ASYNC_ROUTES асинхронными обертками. """
+    return [
+        type(pattern)(
+            pattern.pattern,
+            async_view(pattern.callback),
+            pattern.default_args,
+            pattern.name
+        ) if pattern.name in ASYNC_ROUTES else pattern
+        for pattern in patterns
+    ]
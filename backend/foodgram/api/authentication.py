@@ -0,0 +1,77 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from user.models import User
+
+REVOKED_KEY = 'jwt_revoked:{}'
+
+
+def revoke(token):
+    """ Запрещает токен доступа до истечения его срока действия. """
+    timeout = token['exp'] - int(time.time())
+    if timeout > 0:
+        cache.set(REVOKED_KEY.format(token[api_settings.JTI_CLAIM]), True,
+                  timeout)
+
+
+def load_deferred(user, *args, **kwargs):
+    """ Догружает отложенные поля пользователя из токена.
+
+    Токен мог пережить удаление учетной записи: вместо DoesNotExist (и
+    ответа 500) запрос не аутентифицируется.
+    """
+    try:
+        User.refresh_from_db(user, *args, **kwargs)
+    except User.DoesNotExist:
+        raise AuthenticationFailed('Пользователь не найден.')
+
+
+def full_user(user):
+    """ Пользователь со всеми полями одним запросом, если часть отложена.
+
+    Токен мог пережить удаление или отключение учетной записи: такой
+    пользователь не аутентифицируется.
+    """
+    if not user.get_deferred_fields():
+        return user
+    try:
+        user = User.objects.get(pk=user.pk)
+    except User.DoesNotExist:
+        raise AuthenticationFailed('Пользователь не найден.')
+    if not user.is_active:
+        raise AuthenticationFailed('Учетная запись отключена.')
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """ Аутентификация по JWT без запросов к базе.
+
+    Подпись и срок токена проверяются локально, отзыв - по списку в
+    кэше (его бэкенд не должен обращаться к базе, см. api.checks).
+    Пользователь строится из id в токене: остальные поля отложены и
+    загружаются из базы только при обращении к ним, а save() сохраняет
+    лишь загруженные поля.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if cache.get(REVOKED_KEY.format(token[api_settings.JTI_CLAIM])):
+            raise InvalidToken('Токен отозван.')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('В токене нет идентификатора пользователя.')
+        user = User.from_db(
+            DEFAULT_DB_ALIAS, [api_settings.USER_ID_FIELD], [user_id]
+        )
+        user.refresh_from_db = partial(load_deferred, user)
+        return user
@@ -0,0 +1,192 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from foodgram.replicas import primary_while_recent, version_token
+from rest_framework.renderers import JSONRenderer
+
+TAGS_VERSION_KEY = 'tags_version'
+RECIPES_VERSION_KEY = 'recipes_version'
+STATS_KEY = 'response_cache_stats:{}:{}'
+
+
+def invalidate(version_key):
+    """ Сбрасывает закэшированные ответы во всех процессах. """
+    cache.set(version_key, version_token(), None)
+
+
+def count(version_key, outcome):
+    """ Увеличивает счетчик попаданий (hit) или промахов (miss) кэша. """
+    key = STATS_KEY.format(version_key, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats(version_key):
+    """ Счетчики кэша: общие для процессов, если общий бэкенд кэша. """
+    return {
+        outcome: cache.get(STATS_KEY.format(version_key, outcome), 0)
+        for outcome in ('hit', 'miss')
+    }
+
+
+def get_version(version_key):
+    version = cache.get(version_key)
+    if version is not None:
+        return version
+    version = version_token()
+    if cache.add(version_key, version, None):
+        return version
+    return cache.get(version_key)
+
+
+class ReferenceCacheMixin:
+    """ Отдает справочные данные из кэша готовыми байтами с ETag.
+
+    Ответ сериализуется один раз на версию модели и адрес запроса;
+    при совпадении If-None-Match возвращается 304 без тела.
+    """
+
+    cache_control = 'public, max-age=0, must-revalidate'
+    cache_version_key = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(*args, **kwargs)
+        version = get_version(self.cache_version_key)
+        path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+        key = f'reference_cache:{self.cache_version_key}:{version}:{path}'
+        entry = cache.get(key)
+        if entry is None:
+            with primary_while_recent(version):
+                response = handler(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = JSONRenderer().render(response.data)
+            entry = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+            cache.set(key, entry, None)
+        body, etag = entry
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        return response
+
+
+class ConditionalGetMixin:
+    """ Условные GET-запросы по отпечатку данных без сериализации ответа.
+
+    Отпечаток строится из версий в кэше или одним легким запросом; если
+    клиентская копия актуальна, возвращается 304, иначе к полному ответу
+    добавляются ETag и Last-Modified, если передана дата изменения.
+    Last-Modified отдается только анонимным пользователям: у
+    авторизованных ответ зависит еще и от их избранного и корзины, у
+    которых нет даты изменения.
+    """
+
+    def conditional_response(self, request, fingerprint, last_modified,
+                             handler, *args, **kwargs):
+        etag = '"{}"'.format(
+            hashlib.sha1(repr(fingerprint).encode()).hexdigest()
+        )
+        if request.user.is_authenticated or last_modified is None:
+            timestamp = None
+        else:
+            timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class AnonymousCacheMixin:
+    """ Кэш готовых ответов списка для анонимных пользователей.
+
+    Ответ одинаков для всех анонимов, поэтому ключом служат только
+    нормализованные параметры фильтров и постраничного вывода. Запросы с
+    другими параметрами в кэш не попадают. Версию сбрасывают сигналы
+    моделей, из которых строится ответ.
+    """
+
+    anonymous_cache_version_key = None
+
+    def anonymous_cache_key(self, request, version):
+        paginator = self.paginator
+        allowed = set(self.filterset_class.base_filters) | {
+            paginator.page_query_param,
+            paginator.page_size_query_param,
+            getattr(paginator, 'cursor_query_param', None),
+        }
+        if not set(request.query_params) <= allowed:
+            return None
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name)))
+            for name in request.query_params
+        )
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()
+        return (
+            f'anonymous_cache:{self.anonymous_cache_version_key}:'
+            f'{version}:{request.get_host()}:{digest}'
+        )
+
+    def anonymous_cached_response(self, request, handler, *args, **kwargs):
+        key = None
+        if (request.user.is_anonymous
+                and request.accepted_renderer.format == 'json'):
+            version = get_version(self.anonymous_cache_version_key)
+            key = self.anonymous_cache_key(request, version)
+        if key is None:
+            return handler(*args, **kwargs)
+        entry = cache.get(key)
+        if entry is None:
+            count(self.anonymous_cache_version_key, 'miss')
+            with primary_while_recent(version):
+                response = handler(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, (
+                JSONRenderer().render(response.data),
+                response.get('ETag'),
+                response.get('Last-Modified'),
+            ), None)
+            response['X-Cache'] = 'MISS'
+            return response
+        count(self.anonymous_cache_version_key, 'hit')
+        body, etag, last_modified = entry
+        timestamp = parse_http_date_safe(last_modified or '')
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = last_modified
+        patch_vary_headers(response, ['Authorization'])
+        response['X-Cache'] = 'HIT'
+        return response
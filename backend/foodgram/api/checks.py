@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+STATELESS_JWT = 'api.authentication.StatelessJWTAuthentication'
+DATABASE_CACHE = 'django.core.cache.backends.db.DatabaseCache'
+
+
+@register()
+def revoke_list_cache(app_configs, **kwargs):
+    """ Список отзыва JWT не должен храниться в кэше в базе данных.
+
+    Иначе проверка отзыва - SQL-запрос на каждый запрос с токеном.
+    """
+    classes = settings.REST_FRAMEWORK.get('DEFAULT_AUTHENTICATION_CLASSES', [])
+    if (STATELESS_JWT in classes
+            and settings.CACHES['default']['BACKEND'] == DATABASE_CACHE):
+        return [Warning(
+            'Список отзыва JWT хранится в кэше в базе данных.',
+            hint='Задайте CACHE_LOCATION (memcached).',
+            id='api.W001',
+        )]
+    return []
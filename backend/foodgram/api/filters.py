@@ -1,32 +1,107 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Recipe
-from rest_framework.filters import SearchFilter
+from recipes.indexes import filter_by_ids, recipe_ingredient_index
+from recipes.membership import membership
+from recipes.models import Recipe, TagsProperty
+from recipes.search import search_recipes
+
+
+class MultipleValueField(forms.Field):
+    """ Все значения повторяющегося параметра: ?tags=a&tags=b. """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [item for item in value or () if item]
+
+
+class MultipleNumberField(MultipleValueField):
+    default_error_messages = {'invalid': 'Ожидаются целые числа.'}
+
+    def to_python(self, value):
+        try:
+            return [int(item) for item in super().to_python(value)]
+        except ValueError:
+            raise forms.ValidationError(
+                self.error_messages['invalid'], code='invalid'
+            )
+
+
+class MultipleValueFilter(filters.Filter):
+    field_class = MultipleValueField
+
+
+class MultipleNumberFilter(filters.Filter):
+    field_class = MultipleNumberField
 
 
 class Filter(FilterSet):
     author = filters.NumberFilter(field_name='author__id')
-    tags = filters.CharFilter(field_name='tags__slug')
+    tags = MultipleValueFilter(method='get_tags')
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ingredients = MultipleNumberFilter(method='get_by_ingredients')
+    exclude_ingredients = MultipleNumberFilter(method='get_by_ingredients')
+    pantry = MultipleNumberFilter(method='get_by_ingredients')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ingredients', 'exclude_ingredients', 'pantry')
+
+    def get_tags(self, queryset, name, value):
+        """ Рецепты хотя бы с одним из тегов, каждый ровно один раз.
+
+        EXISTS вместо JOIN не размножает строки и не требует DISTINCT.
+        """
+        return queryset.filter(Exists(TagsProperty.objects.filter(
+            tags__slug__in=value, recipe=OuterRef('pk')
+        )))
 
     def get_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(
-                favorite_recipe__user=self.request.user
+                id__in=membership.get(self.request.user).favorites
             )
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(usershopcart__user=self.request.user)
+        if value and self.request.user.is_authenticated:
+            return queryset.filter(
+                id__in=membership.get(self.request.user).cart
+            )
         return queryset
 
+    def get_search(self, queryset, name, value):
+        """ Полнотекстовый поиск, результаты упорядочены по релевантности. """
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
+    def get_by_ingredients(self, queryset, name, value):
+        # Три параметра по ингредиентам применяются вместе
+        # в filter_queryset.
+        return queryset
 
-class CustomSearchFilter(SearchFilter):
-    search_param = 'name'
+    def filter_queryset(self, queryset):
+        """ "Что приготовить": отбор по ингредиентам через индекс в памяти.
+
+        Обязательные, исключенные и имеющиеся продукты обрабатываются
+        операциями над массивами NumPy, база получает готовый список id.
+        """
+        queryset = super().filter_queryset(queryset)
+        include = self.form.cleaned_data.get('ingredients')
+        exclude = self.form.cleaned_data.get('exclude_ingredients')
+        pantry = self.form.cleaned_data.get('pantry')
+        if not (include or exclude or pantry):
+            return queryset
+        return filter_by_ids(
+            queryset,
+            *recipe_ingredient_index.match(
+                include or (), exclude or (), pantry or ()
+            )
+        )
@@ -0,0 +1,152 @@
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+
+from api.urls import async_urlpatterns, sync_urlpatterns
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from django.urls import include, path, reverse
+from rest_framework.authtoken.models import Token
+
+from .query_budget import Command as BudgetCommand
+
+
+class SyncUrls:
+    urlpatterns = [
+        path('api/', include((sync_urlpatterns, 'api'))),
+    ]
+
+
+class AsyncUrls:
+    urlpatterns = [
+        path('api/', include((async_urlpatterns, 'api'))),
+    ]
+
+
+class Command(BudgetCommand):
+    help = (
+        'Сравнивает синхронные и асинхронные представления чтения под '
+        'ASGI при одновременных запросах и искусственной задержке базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--latency', type=float, default=20,
+            help='Задержка каждого SQL-запроса, мс.'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.latency = options['latency'] / 1000
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        connection_created.connect(self.add_latency)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    MEDIA_ROOT=media_root,
+                    PASSWORD_HASHERS=[
+                        'django.contrib.auth.hashers.MD5PasswordHasher'
+                    ]
+                ):
+                    seed = self.seed(options)
+                    token, _ = Token.objects.get_or_create(
+                        user=seed['viewer']
+                    )
+                    for connection in connections.all():
+                        self.add_latency(connection)
+                    results = [
+                        (mode, name, self.run_mode(
+                            urlconf, path, token.key, options
+                        ))
+                        for name, path in self.paths(seed)
+                        for mode, urlconf in (
+                            ('sync', SyncUrls), ('async', AsyncUrls)
+                        )
+                    ]
+        finally:
+            connection_created.disconnect(self.add_latency)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        self.print_results(results)
+
+    def add_latency(self, connection, **kwargs):
+        if self.delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.delay)
+
+    def delay(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def paths(self, seed):
+        with override_settings(ROOT_URLCONF=SyncUrls):
+            return [
+                ('recipes-list', reverse('api:recipes-list')),
+                ('recipes-detail', reverse(
+                    'api:recipes-detail', kwargs={'pk': seed['recipe']}
+                )),
+                ('ingredients-list', reverse('api:ingredients-list')
+                 + '?name=ингр'),
+                ('tags-list', reverse('api:tags-list')),
+                ('users_subscriptions-list',
+                 reverse('api:users_subscriptions-list')),
+            ]
+
+    def run_mode(self, urlconf, path, token, options):
+        with override_settings(ROOT_URLCONF=urlconf):
+            return asyncio.run(self.load(path, token, options))
+
+    async def load(self, path, token, options):
+        """ requests запросов, не более concurrency одновременно. """
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        timings = []
+        errors = 0
+
+        async def request():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(
+                    path, authorization=f'Token {token}'
+                )
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        timings.sort()
+        return {
+            'rps': len(timings) / elapsed,
+            'p50': statistics.median(timings) * 1000,
+            'p95': timings[int(len(timings) * 0.95) - 1] * 1000,
+            'errors': errors,
+        }
+
+    def print_results(self, results):
+        width = max(len(name) for _, name, _ in results)
+        header = (
+            f'{"endpoint":<{width}}  {"mode":<5}  {"rps":>8}  '
+            f'{"p50 ms":>8}  {"p95 ms":>8}  errors'
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for mode, name, row in results:
+            self.stdout.write(
+                f'{name:<{width}}  {mode:<5}  {row["rps"]:>8.1f}  '
+                f'{row["p50"]:>8.1f}  {row["p95"]:>8.1f}  {row["errors"]}'
+            )
@@ -0,0 +1,800 @@
+import base64
+import io
+import json
+import random
+import tempfile
+import time
+import uuid
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from api.pagination import RecipePagination
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+from django.test import AsyncClient
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from django.urls import URLResolver, reverse
+from jobs.models import Job
+from PIL import Image
+from recipes.counters import COUNTERS, reconcile
+from recipes.models import (Favorite, IngredientProperty, Ingredients, Recipe,
+                            Tags, TagsProperty, UserShopCart)
+from recipes.search import rebuild_search_index
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from user.models import Follow, User
+
+PASSWORD = 'budget-password'
+
+Endpoint = namedtuple(
+    'Endpoint',
+    'method name kwargs user data params status max_queries max_ms auth '
+    'handler label expect',
+    defaults=('token', 'wsgi', None, None)
+)
+
+# Наименьший объем данных для сценариев: у зрителя 10 рецептов в
+# избранном и 30 в корзине и нужен рецепт вне их, особые пользователи
+# занимают users[1:7], новый рецепт берет 12 ингредиентов.
+MINIMUMS = {'users': 8, 'recipes': 41, 'ingredients': 12}
+
+# Команды сверки денормализованных данных, которые после сценариев
+# записи должны проходить с --check.
+CONSISTENCY_CHECKS = [
+    'rebuild_shop_lists',
+    'reconcile_counters',
+]
+
+# Маршруты api/urls.py, которые не обслуживаются вьюсетами.
+IGNORED_ROUTES = {
+    'users_subscriptions-detail',
+}
+
+
+def isolated_caches():
+    """ Настроенные в settings кэши с собственным префиксом ключей.
+
+    Бюджеты считаются на том же бэкенде кэша, что и в работе: если
+    обращения к нему стоят SQL-запросов, они попадают в бюджет. Префикс
+    не дает прогону читать и сбрасывать версии работающих процессов.
+    """
+    prefix = f'query_budget_{uuid.uuid4().hex}'
+    return {
+        alias: dict(config, KEY_PREFIX=prefix)
+        for alias, config in settings.CACHES.items()
+    }
+
+
+def ingredient_amounts(recipe):
+    """ Состав рецепта из ответа API: id ингредиента -> количество. """
+    return {item['id']: item['amount'] for item in recipe['ingredients']}
+
+
+def tag_slugs(recipe):
+    return {tag['slug'] for tag in recipe['tags']}
+
+
+def matches(queryset, condition=None):
+    """ Проверка списка рецептов по выборке queryset из базы.
+
+    При выводе по номеру страницы сравнивается count, при выводе по
+    курсору - id первой страницы. condition(рецепт) проверяет каждый
+    рецепт ответа.
+    """
+    def expect(data):
+        recipes = data['results']
+        if 'count' in data:
+            expected = queryset.count()
+            if data['count'] != expected:
+                return f'count {data["count"]} вместо {expected}'
+        else:
+            expected = list(
+                queryset.order_by(*RecipePagination.ordering).values_list(
+                    'id', flat=True
+                )[:len(recipes) + 1]
+            )
+            ids = [item['id'] for item in recipes]
+            if ids != expected[:len(ids)] or (
+                    len(expected) > len(ids)) != bool(data['next']):
+                return 'не те рецепты на странице'
+        for item in recipes:
+            if condition is not None and not condition(item):
+                return f'рецепт {item["id"]} не подходит под фильтр'
+        return None
+    return expect
+
+
+def has_amounts(amounts, **fields):
+    """ Проверка рецепта из ответа: состав и значения полей. """
+    def expect(data):
+        if ingredient_amounts(data) != amounts:
+            return 'состав рецепта не совпадает с отправленным'
+        for name, value in fields.items():
+            if data[name] != value:
+                return f'{name} = {data[name]!r}'
+        stored = dict(
+            IngredientProperty.objects.filter(recipe=data['id']).values_list(
+                'ingredient_id', 'amount'
+            )
+        )
+        if stored != amounts:
+            return 'состав рецепта в базе не совпадает с ответом'
+        return None
+    return expect
+
+
+def shop_list_totals(user):
+    """ Проверка файла списка покупок по составу рецептов в корзине. """
+    def expect(text):
+        expected = Counter(dict(
+            IngredientProperty.objects.filter(
+                recipe__usershopcart__user=user
+            ).values('ingredient__name').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient__name', 'total')
+        ))
+        totals = Counter()
+        name = None
+        for line in text.splitlines():
+            key, _, value = line.partition(' - ')
+            if key == 'Название ингредиента':
+                name = value
+            elif key == 'количество':
+                totals[name] += int(value)
+        if totals != expected:
+            return 'итоги списка покупок не совпадают с корзиной'
+        return None
+    return expect
+
+
+def subscriptions(user, recipes_limit=None):
+    """ Проверка подписок: авторы, число рецептов и recipes_limit. """
+    def expect(data):
+        following = set(
+            Follow.objects.filter(user=user).values_list('author', flat=True)
+        )
+        for author in data['results']:
+            if author['id'] not in following or not author['is_subscribed']:
+                return f'автор {author["id"]} не в подписках'
+            count = Recipe.objects.filter(author=author['id']).count()
+            if author['recipes_count'] != count:
+                return f'recipes_count автора {author["id"]}'
+            if len(author['recipes']) != min(count, recipes_limit or count):
+                return f'рецептов автора {author["id"]}'
+        return None
+    return expect
+
+
+def has_keys(*keys):
+    def expect(data):
+        missing = [key for key in keys if key not in data]
+        return 'нет ' + ', '.join(missing) if missing else None
+    return expect
+
+
+def endpoints(seed):
+    """ Сценарии запросов и бюджеты для каждого маршрута api/urls.py. """
+    viewer = seed['viewer']
+    recipe = seed['recipe']
+    author = seed['author']
+    ingredient = seed['ingredient']
+    include = seed['ingredients'][:1]
+    exclude = seed['ingredients'][1:3]
+    pantry = seed['ingredients'][:5]
+    new_recipe = {
+        'ingredients': [
+            {'id': pk, 'amount': 10} for pk in seed['ingredients'][:10]
+        ],
+        'tags': seed['tags'],
+        'image': seed['image'],
+        'name': 'Рецепт для проверки бюджета',
+        'text': 'Описание',
+        'cooking_time': 15,
+    }
+    changed_recipe = dict(new_recipe, name='Новое название', ingredients=[
+        {'id': pk, 'amount': 20} for pk in seed['ingredients'][2:12]
+    ])
+    return [
+        Endpoint('get', 'api-root', {}, None, None, None, 200, 0, 100),
+        Endpoint(
+            'get', 'tags-list', {}, None, None, None, 200, 1, 100,
+            expect=lambda data: None if sorted(
+                tag['id'] for tag in data
+            ) == sorted(seed['tags']) else 'не все теги'
+        ),
+        Endpoint(
+            'get', 'tags-detail', {'pk': seed['tags'][0]}, None, None, None,
+            200, 1, 100
+        ),
+        Endpoint(
+            'get', 'ingredients-list', {}, None, None, {'name': 'аб'},
+            200, 1, 200
+        ),
+        Endpoint(
+            'get', 'ingredients-detail', {'pk': ingredient}, None, None,
+            None, 200, 1, 100
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, None, None, None, 200, 4, 300,
+            expect=matches(Recipe.objects.all())
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, viewer, None, None, 200, 7, 300,
+            expect=matches(Recipe.objects.all())
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, viewer, None,
+            {'tags': 'lunch', 'is_favorited': 1}, 200, 5, 300,
+            expect=matches(
+                Recipe.objects.filter(
+                    favorite_recipe__user=viewer, tags__slug='lunch'
+                ).distinct(),
+                lambda item: item['is_favorited'] and 'lunch' in tag_slugs(
+                    item
+                )
+            )
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, None, None,
+            {'tags': ['breakfast', 'lunch'], 'page': 3}, 200, 4, 300,
+            expect=matches(
+                Recipe.objects.filter(
+                    tags__slug__in=['breakfast', 'lunch']
+                ).distinct(),
+                lambda item: tag_slugs(item) & {'breakfast', 'lunch'}
+            )
+        ),
+        # Первый запрос по ингредиентам строит индекс в памяти (+2).
+        Endpoint(
+            'get', 'recipes-list', {}, None, None, {'pantry': pantry},
+            200, 6, 300,
+            expect=matches(
+                Recipe.objects.filter(ingredients__in=pantry).distinct(),
+                lambda item: set(ingredient_amounts(item)) & set(pantry)
+            )
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, None, None, {
+                'ingredients': include,
+                'exclude_ingredients': exclude,
+                'cursor': ''
+            }, 200, 3, 300,
+            expect=matches(
+                Recipe.objects.filter(ingredients__in=include).exclude(
+                    ingredients__in=exclude
+                )
+            )
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, viewer, None, {'cursor': ''},
+            200, 4, 300,
+            expect=matches(Recipe.objects.all())
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, None, None,
+            {'search': 'рецепт 1', 'page': 2}, 200, 4, 300,
+            expect=lambda data: None if data['results'] and all(
+                item['name'].startswith('Рецепт 1')
+                for item in data['results']
+            ) else 'рецепты не по запросу'
+        ),
+        Endpoint(
+            'get', 'recipes-detail', {'pk': recipe}, viewer, None, None,
+            200, 5, 200,
+            expect=has_amounts(dict(
+                IngredientProperty.objects.filter(recipe=recipe).values_list(
+                    'ingredient_id', 'amount'
+                )
+            ), id=recipe, is_favorited=False)
+        ),
+        Endpoint(
+            'post', 'recipes-list', {}, viewer, new_recipe, None,
+            201, 17, 500,
+            expect=has_amounts(
+                ingredient_amounts(new_recipe), name=new_recipe['name']
+            )
+        ),
+        # Новый рецепт в корзине: правка и удаление меняют список покупок.
+        Endpoint(
+            'post', 'recipes-shopping-cart', {'pk': 'created'}, viewer, None,
+            None, 201, 10, 200, 'token', 'wsgi', 'new recipe'
+        ),
+        Endpoint(
+            'patch', 'recipes-detail', {'pk': 'created'}, viewer,
+            changed_recipe, None, 200, 28, 500,
+            expect=has_amounts(
+                ingredient_amounts(changed_recipe), name='Новое название'
+            )
+        ),
+        Endpoint(
+            'delete', 'recipes-detail', {'pk': 'created'}, viewer, None,
+            None, 204, 18, 300
+        ),
+        # Индекс ингредиентов догоняет правки рецептов выше (+1), а не
+        # строится заново.
+        Endpoint(
+            'get', 'recipes-list', {}, None, None, {'ingredients': include},
+            200, 5, 300,
+            expect=matches(Recipe.objects.filter(ingredients__in=include))
+        ),
+        Endpoint(
+            'post', 'recipes-favorite', {'pk': recipe}, viewer, None, None,
+            201, 8, 200
+        ),
+        Endpoint(
+            'delete', 'recipes-favorite', {'pk': recipe}, viewer, None,
+            None, 204, 6, 200
+        ),
+        Endpoint(
+            'post', 'recipes-shopping-cart', {'pk': recipe}, viewer, None,
+            None, 201, 10, 200
+        ),
+        Endpoint(
+            'delete', 'recipes-shopping-cart', {'pk': recipe}, viewer, None,
+            None, 204, 10, 200
+        ),
+        Endpoint(
+            'get', 'recipes-download-shopping-cart', {}, viewer, None, None,
+            200, 2, 300, expect=shop_list_totals(viewer)
+        ),
+        # Под ASGI потоковый ответ читается в цикле событий.
+        Endpoint(
+            'get', 'recipes-download-shopping-cart', {}, viewer, None, None,
+            200, 2, 300, 'token', 'asgi', expect=shop_list_totals(viewer)
+        ),
+        Endpoint('get', 'users-list', {}, None, None, None, 200, 2, 200),
+        Endpoint(
+            'post', 'users-list', {}, None,
+            {
+                'email': 'budget@example.com',
+                'username': 'budget',
+                'first_name': 'Бюджет',
+                'last_name': 'Запросов',
+                'password': PASSWORD,
+            },
+            None, 201, 6, 300
+        ),
+        Endpoint(
+            'get', 'users-detail', {'pk': author}, viewer, None, None,
+            200, 2, 100,
+            expect=lambda data: None if data['id'] == author
+            else 'не тот пользователь'
+        ),
+        Endpoint('get', 'users-me', {}, viewer, None, None, 200, 1, 100),
+        Endpoint(
+            'post', 'users-subscribe', {'pk': author}, viewer, None, None,
+            201, 12, 300
+        ),
+        Endpoint(
+            'delete', 'users-subscribe', {'pk': author}, viewer, None, None,
+            204, 8, 200
+        ),
+        Endpoint(
+            'get', 'users_subscriptions-list', {}, viewer, None, None,
+            200, 5, 500, expect=subscriptions(viewer)
+        ),
+        Endpoint(
+            'get', 'users_subscriptions-list', {}, viewer, None,
+            {'recipes_limit': 3, 'cursor': ''}, 200, 4, 300,
+            expect=subscriptions(viewer, recipes_limit=3)
+        ),
+        Endpoint(
+            'get', 'recipes-cache-stats', {}, viewer, None, None, 403, 1, 100
+        ),
+        Endpoint('get', 'jobs-list', {}, viewer, None, None, 200, 3, 200),
+        Endpoint(
+            'get', 'jobs-detail', {'pk': seed['job']}, viewer, None, None,
+            200, 2, 100
+        ),
+        Endpoint(
+            'post', 'users-set-password', {}, seed['password_user'],
+            {'new_password': 'changed-password',
+             'current_password': PASSWORD},
+            None, 204, 4, 300
+        ),
+        Endpoint(
+            'post', 'login', {}, None,
+            {'email': seed['login_email'], 'password': PASSWORD},
+            None, 200, 5, 300
+        ),
+        Endpoint(
+            'post', 'logout', {}, seed['logout_user'], None, None,
+            204, 3, 200
+        ),
+        Endpoint(
+            'get', 'recipes-list', {}, viewer, None, None, 200, 4, 300, 'jwt'
+        ),
+        Endpoint(
+            'post', 'jwt-create', {}, None,
+            {'email': seed['login_email'], 'password': PASSWORD},
+            None, 200, 2, 300, expect=has_keys('access', 'refresh')
+        ),
+        Endpoint(
+            'post', 'jwt-refresh', {}, None, {'refresh': seed['refresh']},
+            None, 200, 6, 300, expect=has_keys('access')
+        ),
+        Endpoint(
+            'post', 'jwt-refresh', {}, None,
+            {'refresh': seed['inactive_refresh']}, None, 401, 1, 100
+        ),
+        Endpoint(
+            'post', 'jwt-verify', {}, None, {'token': seed['access']},
+            None, 200, 1, 100
+        ),
+        Endpoint(
+            'post', 'jwt-revoke', {}, seed['revoke_user'],
+            {'refresh': seed['revoke_refresh']}, None, 204, 5, 200, 'jwt'
+        ),
+    ]
+
+
+def case_key(case):
+    """ Подпись сценария в таблице результатов. """
+    key = f'{case.method.upper()} {case.name}'
+    if case.params:
+        key += '?' + '&'.join(
+            f'{name}={value}' for name, value in case.params.items()
+        )
+    elif case.method == 'get' and case.user is not None:
+        key += ' (auth)' if case.auth == 'token' else f' ({case.auth})'
+    if case.label:
+        key += f' ({case.label})'
+    if case.handler != 'wsgi':
+        key += f' [{case.handler}]'
+    if case.status >= 400:
+        key += f' -> {case.status}'
+    return key
+
+
+def read_body(response):
+    """ Тело ответа, в том числе потокового, и текст ошибки чтения. """
+    if not getattr(response, 'streaming', False):
+        return response.content, None
+    try:
+        return b''.join(response.streaming_content), None
+    except Exception as error:
+        return b'', f'stream {type(error).__name__}'
+
+
+def decode(response, body):
+    """ Данные ответа для проверки: JSON или текст. """
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(body)
+    return body.decode()
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def registered_routes():
+    """ Имена всех маршрутов, зарегистрированных в api/urls.py. """
+    from api import urls
+
+    return set(route_names(urls.urlpatterns))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет временную базу данных и проверяет бюджет SQL-запросов '
+        'и времени ответа, а также содержимое ответов для каждого маршрута '
+        'API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument(
+            '--time-scale', type=float, default=1.0,
+            help='Множитель бюджетов времени для медленных машин.'
+        )
+        parser.add_argument(
+            '--save', help='Сохранить результаты в JSON-файл.'
+        )
+        parser.add_argument(
+            '--compare', help='Сравнить с результатами из JSON-файла.'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    MEDIA_ROOT=media_root,
+                    PASSWORD_HASHERS=[
+                        'django.contrib.auth.hashers.MD5PasswordHasher'
+                    ],
+                    CACHES=isolated_caches()
+                ):
+                    seed = self.seed(options)
+                    results = self.run_endpoints(
+                        seed, options['time_scale']
+                    )
+                    drift = self.check_consistency()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as results_file:
+                previous = json.load(results_file)
+        self.print_table(results, previous)
+        if options['save']:
+            with open(options['save'], 'w') as results_file:
+                json.dump(
+                    {key: row['queries'] for key, row in results.items()},
+                    results_file, indent=2, ensure_ascii=False
+                )
+
+        for error in drift:
+            self.stdout.write(self.style.ERROR(error))
+        failed = [key for key, row in results.items() if row['errors']]
+        errors = ['Не пройдены: ' + ', '.join(failed)] if failed else []
+        if errors or drift:
+            raise CommandError('; '.join(errors + drift))
+
+    def seed(self, options):
+        """ Заполняет базу реалистичным объемом данных. """
+        too_small = [
+            f'--{name} {minimum}' for name, minimum in MINIMUMS.items()
+            if options[name] < minimum
+        ]
+        if too_small:
+            raise CommandError(
+                'Мало данных для сценариев, нужно не меньше: '
+                + ', '.join(too_small)
+            )
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                password=password
+            )
+            for number in range(options['users'])
+        )
+        users = list(User.objects.order_by('pk'))
+        for tag in ('breakfast', 'lunch', 'dinner'):
+            Tags.objects.create(name=tag, slug=tag)
+        tags = list(Tags.objects.values_list('pk', flat=True))
+        Ingredients.objects.bulk_create(
+            Ingredients(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(options['ingredients'])
+        )
+        ingredients = list(Ingredients.objects.values_list('pk', flat=True))
+        authors = users[:max(1, len(users) // 5)]
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=random.choice(authors),
+                name=f'Рецепт {number}',
+                text='Описание рецепта ' * 20,
+                image='recipes/images/budget.png',
+                cooking_time=random.randint(1, 120)
+            )
+            for number in range(options['recipes'])
+        )
+        recipes = list(Recipe.objects.values_list('pk', flat=True))
+        rebuild_search_index()
+        IngredientProperty.objects.bulk_create(
+            IngredientProperty(
+                recipe_id=recipe, ingredient_id=ingredient,
+                amount=random.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient in random.sample(ingredients, 6)
+        )
+        TagsProperty.objects.bulk_create(
+            TagsProperty(recipe_id=recipe, tags_id=tag)
+            for recipe in recipes
+            for tag in random.sample(tags, random.randint(1, len(tags)))
+        )
+        viewer = users[-1]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in users
+            for author in random.sample(authors, min(10, len(authors)))
+            if user != author
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe_id=recipe)
+            for user in users
+            for recipe in random.sample(recipes, min(10, len(recipes)))
+        )
+        UserShopCart.objects.bulk_create(
+            UserShopCart(user=viewer, recipe_id=recipe)
+            for recipe in random.sample(recipes, min(30, len(recipes)))
+        )
+        for counter in COUNTERS:
+            reconcile(*counter)
+        call_command('rebuild_shop_lists', stdout=io.StringIO())
+        Job.objects.bulk_create(
+            Job(
+                name='recipes.build_image_variants',
+                payload={'recipe_id': recipe},
+                user=viewer
+            )
+            for recipe in recipes[:50]
+        )
+        image = io.BytesIO()
+        Image.new('RGB', (32, 32), 'orange').save(image, 'PNG')
+        followed = Follow.objects.filter(user=viewer).values('author')
+        inactive = users[6]
+        inactive.is_active = False
+        inactive.save(update_fields=['is_active'])
+        return {
+            'viewer': viewer,
+            # Автор вне подписок зрителя, по возможности с рецептами.
+            'author': User.objects.exclude(pk__in=followed).exclude(
+                pk=viewer.pk
+            ).order_by('-recipes_count', 'pk').values_list(
+                'pk', flat=True
+            )[0],
+            'recipe': Recipe.objects.exclude(
+                favorite_recipe__user=viewer
+            ).exclude(usershopcart__user=viewer).values_list(
+                'pk', flat=True
+            )[0],
+            'ingredient': ingredients[0],
+            'job': Job.objects.filter(user=viewer).values_list(
+                'pk', flat=True
+            )[0],
+            'ingredients': ingredients,
+            'tags': tags,
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                image.getvalue()
+            ).decode(),
+            'password_user': users[1],
+            'logout_user': users[2],
+            'login_email': users[3].email,
+            'refresh': str(RefreshToken.for_user(users[4])),
+            'access': str(AccessToken.for_user(users[4])),
+            'revoke_user': users[5],
+            'revoke_refresh': str(RefreshToken.for_user(users[5])),
+            'inactive_refresh': str(RefreshToken.for_user(inactive)),
+        }
+
+    def run_endpoints(self, seed, time_scale):
+        cases = endpoints(seed)
+        missing = (
+            registered_routes() - IGNORED_ROUTES
+            - {case.name for case in cases}
+        )
+        if missing:
+            raise CommandError(
+                'Нет сценария для маршрутов: ' + ', '.join(sorted(missing))
+            )
+        results = {}
+        created = None
+        for case in cases:
+            kwargs = {
+                key: created if value == 'created' else value
+                for key, value in case.kwargs.items()
+            }
+            response, body, queries, elapsed, failure = self.call(
+                case, kwargs
+            )
+            if case.method == 'post' and case.name == 'recipes-list':
+                created = response.data.get('id')
+            errors = []
+            if response.status_code != case.status:
+                errors.append(f'status {response.status_code}')
+            elif failure:
+                errors.append(failure)
+            elif case.expect is not None:
+                mismatch = case.expect(decode(response, body))
+                if mismatch:
+                    errors.append(mismatch)
+            if queries > case.max_queries:
+                errors.append('queries')
+            if elapsed > case.max_ms * time_scale:
+                errors.append('time')
+            results[case_key(case)] = {
+                'queries': queries,
+                'max_queries': case.max_queries,
+                'ms': elapsed,
+                'max_ms': case.max_ms * time_scale,
+                'errors': errors,
+            }
+        return results
+
+    def check_consistency(self):
+        """ Ошибки команд сверки после всех сценариев. """
+        errors = []
+        for name in CONSISTENCY_CHECKS:
+            try:
+                call_command(name, check=True, stdout=io.StringIO())
+            except CommandError as error:
+                errors.append(f'{name}: {error}')
+        return errors
+
+    def call(self, case, kwargs):
+        """ Выполняет запрос, считает SQL-запросы и время ответа.
+
+        Возвращает также тело ответа и текст ошибки чтения потокового
+        ответа, если она возникла после отправки заголовков.
+        """
+        authorization = None
+        if case.user is not None and case.auth == 'jwt':
+            authorization = f'Bearer {AccessToken.for_user(case.user)}'
+        elif case.user is not None:
+            token, _ = Token.objects.get_or_create(user=case.user)
+            authorization = f'Token {token.key}'
+        url = reverse(f'api:{case.name}', kwargs=kwargs)
+        with ExitStack() as stack:
+            queries = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            start = time.perf_counter()
+            if case.handler == 'asgi':
+                response, (body, failure) = async_to_sync(self.call_asgi)(
+                    case, url, authorization
+                )
+            else:
+                response, (body, failure) = self.call_wsgi(
+                    case, url, authorization
+                )
+            elapsed = (time.perf_counter() - start) * 1000
+        return response, body, sum(map(len, queries)), elapsed, failure
+
+    def call_wsgi(self, case, url, authorization):
+        client = APIClient()
+        if authorization:
+            client.credentials(HTTP_AUTHORIZATION=authorization)
+        request = getattr(client, case.method)
+        if case.method == 'get':
+            response = request(url, case.params)
+        else:
+            response = request(url, case.data, format='json')
+        return response, read_body(response)
+
+    async def call_asgi(self, case, url, authorization):
+        """ Запрос через обработчик ASGI.
+
+        Представление выполняется в основном потоке, как и под сервером,
+        а потоковый ответ читается в цикле событий, где обращения к базе
+        запрещены.
+        """
+        headers = {'authorization': authorization} if authorization else {}
+        response = await getattr(AsyncClient(), case.method)(
+            url, case.params, **headers
+        )
+        return response, read_body(response)
+
+    def print_table(self, results, previous):
+        width = max(len(key) for key in results)
+        header = (
+            f'{"endpoint":<{width}}  {"queries":>7}  {"budget":>6}  '
+            f'{"prev":>5}  {"ms":>8}  {"budget":>7}  status'
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for key, row in results.items():
+            prev = previous.get(key, '')
+            status = ', '.join(row['errors']) or 'ok'
+            line = (
+                f'{key:<{width}}  {row["queries"]:>7}  '
+                f'{row["max_queries"]:>6}  {prev:>5}  {row["ms"]:>8.1f}  '
+                f'{row["max_ms"]:>7.0f}  {status}'
+            )
+            style = self.style.ERROR if row['errors'] else self.style.SUCCESS
+            self.stdout.write(style(line))
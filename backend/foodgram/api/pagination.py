@@ -0,0 +1,106 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """ Постраничный вывод по номеру страницы или по ключу сортировки.
+
+    С параметром cursor (для первой страницы - пустым) страница
+    выбирается условием по ключу ordering вместо OFFSET и без COUNT(*),
+    поэтому любая страница стоит столько же, сколько первая. Запросы
+    со своей сортировкой (например, по релевантности поиска) всегда
+    выводятся по номеру страницы.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and queryset.query.order_by in ((), self.ordering)
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(queryset.model, request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        rows = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_position = [
+                getattr(rows[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            [str(value) for value in self.next_position]
+        ).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            cursor
+        )
+
+    def decode_cursor(self, model, request):
+        cursor = request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def after(self, position):
+        """ Условие "строго после position" в порядке ordering. """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class RecipePagination(KeysetPagination):
+    ordering = ('-pub_date', '-id')
+
+
+class SubscriptionsPagination(KeysetPagination):
+    ordering = ('id',)
@@ -11,10 +11,7 @@ class IsOwnerOnly(permissions.BasePermission):
         )
 
     def has_object_permission(self, request, view, obj):
-        return (
-            obj.username == request.user.username
-            and obj.email == request.user.email
-        )
+        return obj.pk == request.user.pk
 
 
 class AdminOrReadOnly(permissions.BasePermission):
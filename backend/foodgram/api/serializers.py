@@ -1,13 +1,25 @@
 from django.contrib.auth.hashers import make_password
 from django.core.validators import MinValueValidator
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from foodgram.common import R_CHOICES
-from recipes.models import (Favorite, IngredientProperty, Ingredients, Recipe,
-                            Tags, TagsProperty, UserShopCart)
+from jobs.models import Job
+from recipes.images import variant_urls
+from recipes.membership import membership
+from recipes.models import (IngredientProperty, Ingredients, Recipe, Tags,
+                            TagsProperty, UserShopCart, recipe_prefetches)
+from recipes.utilits import change_shop_lists
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
 from user.models import Follow, User
 
+from .authentication import full_user
+
 
 class TagsSerializer(serializers.ModelSerializer):
     """ Сериализаторор для модели Tags."""
@@ -84,6 +96,33 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
 
+class ImageVariantsField(serializers.Field):
+    """ Адреса уменьшенных копий изображения рецепта.
+
+    Пока копии не построены, возвращается None и клиент использует image.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.has_image_variants:
+            return None
+        urls = variant_urls(recipe.image)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {
+            variant: {
+                image_format: request.build_absolute_uri(url)
+                for image_format, url in formats.items()
+            }
+            for variant, formats in urls.items()
+        }
+
+
 class RecipeSerialzer(serializers.ModelSerializer):
 
     tags = TagsSerializer(many=True)
@@ -91,6 +130,7 @@ class RecipeSerialzer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -103,29 +143,30 @@ class RecipeSerialzer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         ]
 
     def get_ingredients(self, obj):
-        ingredients = IngredientProperty.objects.filter(recipe=obj)
-        return IngredientPropertySerializer(ingredients, many=True).data
+        return IngredientPropertySerializer(
+            obj.resipe_ingredient.all(), many=True
+        ).data
+
+    def get_membership(self):
+        """ Избранное и корзина текущего пользователя, одни на весь ответ. """
+        if 'membership' not in self.context:
+            request = self.context.get('request')
+            self.context['membership'] = membership.get(
+                request and request.user
+            )
+        return self.context['membership']
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request.user.is_authenticated:
-            return False
-        return Favorite.objects.filter(
-            user=request.user, recipe_id=obj
-        ).exists()
+        return obj.id in self.get_membership().favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request.user.is_authenticated:
-            return False
-        return UserShopCart.objects.filter(
-            user=request.user, recipe_id=obj
-        ).exists()
+        return obj.id in self.get_membership().cart
 
 
 class AmountSerializer(serializers.ModelSerializer):
@@ -141,9 +182,9 @@ class AmountSerializer(serializers.ModelSerializer):
 class CreateRecipeSerialzer(serializers.ModelSerializer):
 
     author = UserSerializer(read_only=True)
-    ingredients = AmountSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tags.objects.all(), many=True,
+    ingredients = AmountSerializer(many=True, allow_empty=False)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
     )
     image = Base64ImageField()
     cooking_time = serializers.IntegerField(
@@ -166,15 +207,41 @@ class CreateRecipeSerialzer(serializers.ModelSerializer):
             'cooking_time'
         ]
 
+    @staticmethod
+    def resolve(model, ids, field):
+        """ Объекты по списку id одним запросом, без повторов и пропусков. """
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                {field: 'Элементы не должны повторяться'}
+            )
+        objects = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                {field: 'Не найдены id: ' + ', '.join(map(str, missing))}
+            )
+        return [objects[pk] for pk in ids]
+
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            if int(amount) < 1:
-                raise serializers.ValidationError(
-                    {'amount': 'Количество ингредиента не может быть равным 0'}
-                )
-        data['ingredients'] = ingredients
+        ingredients = data.get('ingredients')
+        if ingredients is not None:
+            for ingredient in ingredients:
+                if ingredient['amount'] < 1:
+                    raise serializers.ValidationError(
+                        {'amount': 'Количество ингредиента не может быть '
+                                   'равным 0'}
+                    )
+            objects = self.resolve(
+                Ingredients,
+                [ingredient['id'] for ingredient in ingredients],
+                'ingredients'
+            )
+            data['ingredients'] = [
+                (ingredient, item['amount'])
+                for ingredient, item in zip(objects, ingredients)
+            ]
+        if data.get('tags') is not None:
+            data['tags'] = self.resolve(Tags, data['tags'], 'tags')
         return data
 
     @transaction.atomic
@@ -182,18 +249,17 @@ class CreateRecipeSerialzer(serializers.ModelSerializer):
         bulk_ingredient_list = [
             IngredientProperty(
                 recipe=recipe,
-                ingredient=Ingredients.objects.get(pk=ingredient_data['id']),
-                amount=ingredient_data['amount']
+                ingredient=ingredient,
+                amount=amount
             )
-            for ingredient_data in ingredients
+            for ingredient, amount in ingredients
         ]
         IngredientProperty.objects.bulk_create(bulk_ingredient_list)
 
     @transaction.atomic
     def create_tags(self, tags, recipe):
         bulk_tags_list = [
-            TagsProperty(recipe=recipe, tags=Tags.objects.get(name=tag_data))
-            for tag_data in tags
+            TagsProperty(recipe=recipe, tags=tag) for tag in tags
         ]
         TagsProperty.objects.bulk_create(bulk_tags_list)
 
@@ -201,25 +267,84 @@ class CreateRecipeSerialzer(serializers.ModelSerializer):
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        validated_data['author'] = self.context.get('request').user
+        validated_data['author'] = full_user(
+            self.context.get('request').user
+        )
         recipe = super().create(validated_data)
         self.create_ingredients(ingredients, recipe)
         self.create_tags(tags, recipe)
+        prefetch_related_objects([recipe], *recipe_prefetches())
         return recipe
 
     @transaction.atomic
-    def update(self, instance, validated_data):
+    def update_ingredients(self, ingredients, recipe):
+        """ Приводит состав рецепта к ingredients по разнице с текущим.
+
+        Затрагиваются только добавленные, измененные и удаленные строки.
+        Возвращает изменение количеств {ingredient_id: amount}.
+        """
+        current = {
+            item.ingredient_id: item
+            for item in IngredientProperty.objects.filter(recipe=recipe)
+        }
+        amounts = {ingredient.id: amount for ingredient, amount in ingredients}
+        deltas = {}
+        changed = []
+        for pk, item in current.items():
+            amount = amounts.get(pk, 0)
+            if amount != item.amount:
+                deltas[pk] = amount - item.amount
+                item.amount = amount
+                changed.append(item)
+        removed = [item.pk for item in changed if not item.amount]
+        if removed:
+            IngredientProperty.objects.filter(pk__in=removed).delete()
+        changed = [item for item in changed if item.amount]
+        if changed:
+            IngredientProperty.objects.bulk_update(changed, ['amount'])
+        added = [
+            (ingredient, amount) for ingredient, amount in ingredients
+            if ingredient.id not in current
+        ]
+        if added:
+            self.create_ingredients(added, recipe)
+            deltas.update(
+                (ingredient.id, amount) for ingredient, amount in added
+            )
+        return deltas
 
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+    @transaction.atomic
+    def update_tags(self, tags, recipe):
+        """ Приводит теги рецепта к tags по разнице с текущими. """
+        current = set(
+            TagsProperty.objects.filter(recipe=recipe).values_list(
+                'tags_id', flat=True
+            )
+        )
+        new = {tag.id for tag in tags}
+        if current - new:
+            TagsProperty.objects.filter(
+                recipe=recipe, tags_id__in=current - new
+            ).delete()
+        added = [tag for tag in tags if tag.id not in current]
+        if added:
+            self.create_tags(added, recipe)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
 
         instance = super().update(instance, validated_data)
-        if tags:
-            instance.tags.clear()
-            instance.tags.set(tags)
-        if ingredients:
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+        if tags is not None:
+            self.update_tags(tags, instance)
+        if ingredients is not None:
+            change_shop_lists(
+                UserShopCart.objects.filter(recipe=instance).values_list(
+                    'user_id', flat=True
+                ),
+                self.update_ingredients(ingredients, instance)
+            )
         return instance
 
     def to_representation(self, instance):
@@ -230,12 +355,15 @@ class CreateRecipeSerialzer(serializers.ModelSerializer):
 
 class ShopingCardSerializer(serializers.ModelSerializer):
     """ Сериализатор модели Recipe Shop Cart. """
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = [
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         ]
 
@@ -280,6 +408,36 @@ class RegistrationSerializer(serializers.ModelSerializer):
         return User.objects.create_user(**validated_data)
 
 
+class JWTRevokeSerializer(serializers.Serializer):
+    """ Сериализатор отзыва JWT. """
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as error:
+            raise serializers.ValidationError(str(error))
+
+
+class JWTRefreshSerializer(TokenRefreshSerializer):
+    """ Обновление JWT только для существующих активных пользователей.
+
+    Токены доступа проверяются без базы, поэтому отключение учетной
+    записи вступает в силу здесь: иначе ротация refresh-токенов
+    продлевала бы доступ бесконечно.
+    """
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['refresh'])
+        if not User.objects.filter(
+            pk=token.get(api_settings.USER_ID_CLAIM), is_active=True
+        ).exists():
+            raise AuthenticationFailed(
+                'Пользователь не найден или отключен.'
+            )
+        return super().validate(attrs)
+
+
 class SetPasswordSerializer(serializers.ModelSerializer):
     """ Сериализатор эндпойнта SetPassword. """
     new_password = serializers.CharField(
@@ -329,15 +487,22 @@ class UserSubscribtionsSerializer(serializers.ModelSerializer):
         ]
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author_id=obj.id)
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            recipes = Recipe.objects.filter(author_id=obj.id)
+            if self.context.get('recipes_limit'):
+                recipes = recipes[:self.context['recipes_limit']]
         serializer = ShopingCardSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
-        recipes = Recipe.objects.filter(author_id=obj.id)
-        return recipes.count()
+        return obj.recipes_count
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_followed'):
+            return obj.is_followed
         return Follow.objects.filter(
             user=self.context.get('user'),
             author=obj
@@ -381,3 +546,20 @@ class UsersSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
         ]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """ Сериализатор модели Job. """
+
+    class Meta:
+        model = Job
+        fields = [
+            'id',
+            'name',
+            'status',
+            'attempts',
+            'result',
+            'error',
+            'created_at',
+            'updated_at'
+        ]
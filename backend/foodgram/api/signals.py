@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import (IngredientProperty, Ingredients, Recipe, Tags,
+                            TagsProperty)
+from user.models import User
+
+from .cache import RECIPES_VERSION_KEY, TAGS_VERSION_KEY, invalidate
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+def invalidate_tags_cache(sender, **kwargs):
+    invalidate(TAGS_VERSION_KEY)
+    invalidate_recipes_cache(sender)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=TagsProperty)
+@receiver(post_delete, sender=TagsProperty)
+@receiver(post_save, sender=IngredientProperty)
+@receiver(post_delete, sender=IngredientProperty)
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+@receiver(post_delete, sender=User)
+def invalidate_recipes_cache(sender, **kwargs):
+    """ Сбрасывает кэш списка рецептов для анонимных пользователей.
+
+    Сброс откладывается до фиксации транзакции: иначе параллельный
+    запрос успел бы закэшировать еще старые данные под новой версией.
+    """
+    transaction.on_commit(lambda: invalidate(RECIPES_VERSION_KEY))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipes_cache_on_relations(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_recipes_cache(sender)
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipes_cache_for_author(sender, update_fields, **kwargs):
+    """ Вход пользователя меняет только last_login, его не учитываем. """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_recipes_cache(sender)
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenVerifyView
 
-from .views import (IngredientVievSet, RecipeVievSet, TagsViewSet,
+from .async_views import async_routes
+from .views import (IngredientVievSet, JobViewSet, JWTRefreshView,
+                    JWTRevokeView, RecipeVievSet, TagsViewSet,
                     UserSubscribtionsViewSet, UsersVievSet, UserVievSet)
 
 router = DefaultRouter()
@@ -16,10 +20,30 @@ router.register('users', UserVievSet, basename='users')
 router.register('users', UsersVievSet, basename='users')
 router.register('tags', TagsViewSet, basename='tags')
 router.register('recipes', RecipeVievSet, basename='recipes')
+router.register('jobs', JobViewSet, basename='jobs')
 
 app_name = 'api'
 
-urlpatterns = [
-    path('', include(router.urls)),
+auth_urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
+    path(
+        'auth/jwt/create/', TokenObtainPairView.as_view(), name='jwt-create'
+    ),
+    path('auth/jwt/refresh/', JWTRefreshView.as_view(), name='jwt-refresh'),
+    path('auth/jwt/verify/', TokenVerifyView.as_view(), name='jwt-verify'),
+    path('auth/jwt/revoke/', JWTRevokeView.as_view(), name='jwt-revoke'),
+]
+
+sync_urlpatterns = [
+    path('', include(router.urls)),
+    *auth_urlpatterns,
 ]
+
+async_urlpatterns = [
+    path('', include(async_routes(router.urls))),
+    *auth_urlpatterns,
+]
+
+urlpatterns = (
+    async_urlpatterns if settings.ASYNC_VIEWS else sync_urlpatterns
+)
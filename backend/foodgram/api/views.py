@@ -1,28 +1,56 @@
+from collections import defaultdict
+
 from django.contrib.auth.hashers import make_password
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import BooleanField, Value
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import (Favorite, IngredientProperty, Ingredients, Recipe,
-                            Tags, UserShopCart)
-from recipes.utilits import make_send_file
+from jobs.models import Job
+from recipes.indexes import fuzzy_search, ingredient_index
+from recipes.membership import membership
+from recipes.models import (Favorite, Ingredients, Recipe, ShopListItem, Tags,
+                            UserShopCart)
+from recipes.utilits import SHOP_LIST_FORMATS, make_send_file
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import mixins
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.views import TokenRefreshView
 from user.models import Follow, User
 
 from . import serializers
-from .filters import CustomSearchFilter, Filter
+from .authentication import full_user, revoke
+from .cache import (RECIPES_VERSION_KEY, TAGS_VERSION_KEY, AnonymousCacheMixin,
+                    ConditionalGetMixin, ReferenceCacheMixin, get_stats,
+                    get_version)
+from .filters import Filter
+from .pagination import RecipePagination, SubscriptionsPagination
 from .permissions import IsAuthorOrReadOnly, IsOwnerOnly
 from .serializers import (CreateRecipeSerialzer, IngredientsSerializer,
-                          RecipeSerialzer, SetPasswordSerializer,
-                          ShopingCardSerializer, TagsSerializer,
-                          UserSerializer, UsersSerializer,
+                          JobSerializer, JWTRefreshSerializer,
+                          JWTRevokeSerializer, RecipeSerialzer,
+                          SetPasswordSerializer, ShopingCardSerializer,
+                          TagsSerializer, UserSerializer, UsersSerializer,
                           UserSubscribtionsSerializer)
 
 
+def positive_int_param(request, name):
+    """ Необязательный целочисленный параметр запроса больше нуля. """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    if not value.isdigit() or int(value) < 1:
+        raise ValidationError({name: 'Ожидается положительное целое число'})
+    return int(value)
+
+
 class TagsViewSet(
+    ReferenceCacheMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
@@ -31,41 +59,99 @@ class TagsViewSet(
     queryset = Tags.objects.all()
     serializer_class = TagsSerializer
     pagination_class = None
+    cache_version_key = TAGS_VERSION_KEY
 
 
-class IngredientVievSet(viewsets.ReadOnlyModelViewSet):
+class IngredientVievSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     """ Обработчик модели Ingredient """
     queryset = Ingredients.objects.all()
     serializer_class = IngredientsSerializer
-    filter_backends = (CustomSearchFilter,)
-    search_fields = ('^name',)
     pagination_class = None
+    cache_version_key = ingredient_index.version_key
+
+    def list(self, request):
+        return self.cached_response(request, self.search, request)
 
+    def search(self, request):
+        """ Поиск по началу названия через индекс в памяти процесса.
 
-class RecipeVievSet(viewsets.ModelViewSet):
+        С параметром fuzzy=1 выполняется ранжированный поиск с опечатками.
+        """
+        limit = positive_int_param(request, 'limit')
+        name = request.query_params.get('name', '')
+        if request.query_params.get('fuzzy') in ('1', 'true'):
+            return Response(fuzzy_search(name, limit))
+        return Response(ingredient_index.search(name, limit))
+
+
+class RecipeVievSet(AnonymousCacheMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     """ Обработчик модели Recipe """
+    anonymous_cache_version_key = RECIPES_VERSION_KEY
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = Filter
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return Recipe.objects.with_related()
+        return super().get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_cached_response(
+            request, self.conditional_list, request, *args, **kwargs
+        )
+
+    def conditional_list(self, request, *args, **kwargs):
+        """ ETag списка - версия рецептов и избранного, без запросов к БД.
+
+        Last-Modified у списка не отдается: удаление рецепта или его выход
+        из фильтра не меняют дату изменения оставшихся.
+        """
+        return self.conditional_response(
+            request,
+            (
+                request.get_full_path(), get_version(RECIPES_VERSION_KEY),
+                membership.get(request.user).version
+            ),
+            None,
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            state = Recipe.objects.filter(pk=kwargs['pk']).values_list(
+                'id', 'updated_at', 'author__updated_at'
+            ).first()
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        viewer = membership.get(request.user)
+        return self.conditional_response(
+            request,
+            state + (state[0] in viewer.favorites, state[0] in viewer.cart),
+            max(state[1:]),
+            super().retrieve, request, *args, **kwargs
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAdminUser],
+        name='cache_stats'
+    )
+    def cache_stats(self, request):
+        """ Попадания и промахи кэша списка для анонимов """
+        return Response(get_stats(RECIPES_VERSION_KEY))
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeSerialzer
         return CreateRecipeSerialzer
 
-    def create(self, request, *args, **kwargs):
-        data = request.data
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        recipe = get_object_or_404(Recipe, pk=serializer.data.get('id'))
-        new_serializer = CreateRecipeSerialzer(
-            recipe,
-            context={'request': request}
-        )
-        return Response(new_serializer.data, status=status.HTTP_201_CREATED)
-
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -76,7 +162,7 @@ class RecipeVievSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        recipe = get_object_or_404(Recipe, pk=serializer.data.get('id'))
+        recipe = Recipe.objects.with_related().get(pk=instance.pk)
         new_serializer = serializers.RecipeSerialzer(
             recipe,
             context={'request': request},
@@ -84,9 +170,6 @@ class RecipeVievSet(viewsets.ModelViewSet):
         )
         return Response(new_serializer.data, status=status.HTTP_200_OK)
 
-    def perform_update(self, serializer):
-        serializer.save(author=self.request.user)
-
     @action(
         detail=False,
         methods=['get'],
@@ -95,19 +178,38 @@ class RecipeVievSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         """ Скачать файл со списком ингредиентов """
-        ingredient = IngredientProperty.objects.filter(
-            recipe__usershopcart__user=request.user
+        file_type = request.query_params.get('filetype', 'txt')
+        if file_type not in SHOP_LIST_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: ' + ', '.join(
+                    SHOP_LIST_FORMATS
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ingredient = ShopListItem.objects.filter(
+            user=request.user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name')
 
-        file_data = make_send_file(ingredient)
-        return HttpResponse(
+        content_type, file_data = make_send_file(
+            ingredient.iterator(), file_type
+        )
+        if isinstance(request._request, ASGIRequest):
+            # Под ASGI ответ отдается из цикла событий, где обращаться к
+            # базе нельзя: файл собирается здесь, в потоке представления.
+            file_data = list(file_data)
+        response = StreamingHttpResponse(
             file_data,
-            content_type='text/plain',
+            content_type=content_type,
             status=status.HTTP_200_OK
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_type}"'
+        )
+        return response
 
     @action(
         detail=True,
@@ -208,7 +310,7 @@ class UserVievSet(
         name='me'
     )
     def me(self, request, pk=None):
-        data = UserSerializer(request.user, many=False).data
+        data = UserSerializer(full_user(request.user), many=False).data
         return Response(data, status=status.HTTP_200_OK)
 
     @action(
@@ -221,7 +323,7 @@ class UserVievSet(
         """ Смена пароля """
         new_password = request.data.get('new_password')
         current_password = request.data.get('current_password')
-        user = User.objects.get(username=request.user)
+        user = User.objects.get(pk=request.user.pk)
         serializer = SetPasswordSerializer(user, data=request.data)
         serializer.is_valid(raise_exception=True)
         if user.check_password(current_password):
@@ -251,7 +353,10 @@ class UserVievSet(
                 partial=True,
                 context={
                     'author': author,
-                    'user': user
+                    'user': user,
+                    'recipes_limit': positive_int_param(
+                        request, 'recipes_limit'
+                    )
                 }
             )
             if serializer.is_valid(raise_exception=True):
@@ -275,17 +380,50 @@ class UserVievSet(
 class UserSubscribtionsViewSet(viewsets.ModelViewSet):
     """ Список авторов на которых подписан пользователь """
     permission_classes = [IsOwnerOnly]
+    pagination_class = SubscriptionsPagination
 
     def list(self, request):
         user = request.user
-        authors = Follow.objects.select_related('author').filter(user=user)
-        recipes = Recipe.objects.filter(author__in=authors.values('author_id'))
-        queryset = User.objects.filter(pk__in=authors.values('author_id'))
+        recipes_limit = positive_int_param(request, 'recipes_limit')
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_followed=Value(True, output_field=BooleanField())
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
+        recipes_by_author = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_authors(
+            [author.id for author in page], recipes_limit
+        ):
+            recipes_by_author[recipe.author_id].append(recipe)
         serializer = UserSubscribtionsSerializer(page, many=True, context={
-            'recipes': recipes,
-            'queryset': queryset,
+            'recipes_by_author': recipes_by_author,
             'user': user
         }
         )
         return self.get_paginated_response(serializer.data)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ Статус фоновых задач текущего пользователя """
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+
+class JWTRevokeView(APIView):
+    """ Отзыв JWT: refresh - в черный список, текущий access - в кэш. """
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        serializer = JWTRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.validated_data['refresh'].blacklist()
+        if isinstance(request.auth, AccessToken):
+            revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JWTRefreshView(TokenRefreshView):
+    """ Обновление JWT с проверкой учетной записи. """
+    serializer_class = JWTRefreshSerializer
@@ -8,9 +8,29 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
 import os
+import threading
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_asgi_application()
+
+from django.db import connections  # noqa: E402
+from django.urls import get_resolver  # noqa: E402
+from recipes import indexes  # noqa: E402
+
+
+def warm_up():
+    get_resolver().url_patterns
+    indexes.ingredient_index.warm_up()
+    indexes.recipe_ingredient_index.warm_up()
+    connections.close_all()
+
+
+# Сервер ASGI импортирует модуль внутри цикла событий, где обращаться
+# к базе синхронно нельзя. Индексы строятся, а URL-схема (при импорте
+# сериализаторов открываются транзакции) загружается в отдельном потоке.
+thread = threading.Thread(target=warm_up)
+thread.start()
+thread.join()
@@ -0,0 +1,29 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Пагинатор админки, не считающий строки больших таблиц.
+
+    Для списка без фильтров на PostgreSQL число строк берется из
+    статистики планировщика (pg_class.reltuples) вместо COUNT(*),
+    если таблица больше threshold строк.
+    """
+
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.threshold:
+                return int(row[0])
+        return super().count
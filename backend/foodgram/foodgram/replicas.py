@@ -0,0 +1,150 @@
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = ContextVar('replica_state', default=None)
+
+
+class ReadState:
+    """ Куда читать в рамках запроса и была ли в нем запись. """
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def primary():
+    """ Чтение с основной базы внутри блока.
+
+    Нужно для данных, которые кэшируются под версией: прочитанные с
+    отстающей реплики, они остались бы устаревшими до следующего сброса.
+    """
+    state = _state.get()
+    if state is None or not state.replica:
+        yield
+        return
+    state.replica = False
+    try:
+        yield
+    finally:
+        state.replica = not state.wrote
+
+
+def version_token():
+    """ Новый токен версии кэша: момент создания и случайная часть. """
+    return f'{time.time():.3f}:{uuid.uuid4().hex}'
+
+
+@contextmanager
+def primary_while_recent(version):
+    """ primary(), пока реплика может не видеть изменение версии.
+
+    Версия сменилась менее REPLICA_STICKY_SECONDS назад - данные под ней
+    читаются с основной базы, позже - с реплики: считается, что она
+    отстает не больше этого окна, как и для cookie после записи.
+    """
+    try:
+        age = time.time() - float(str(version).partition(':')[0])
+    except ValueError:
+        age = 0
+    if age > settings.REPLICA_STICKY_SECONDS:
+        yield
+        return
+    with primary():
+        yield
+
+
+class ReplicaRouter:
+    """ Безопасные запросы читают с реплики, остальное - основная база.
+
+    После первой записи запрос до конца читает с основной базы, чтобы
+    видеть свои изменения. Внутри транзакции чтение тоже идет с основной.
+    Вне запросов (команды, фоновые задачи) используется только основная.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is not None and state.replica
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaMiddleware:
+    """ Выбирает базу для чтения и закрепляет клиента за основной.
+
+    После запроса с записью клиент получает cookie на
+    REPLICA_STICKY_SECONDS секунд: пока реплика догоняет, его чтения
+    идут на основную базу и он видит собственные изменения. Работает и
+    в синхронной, и в асинхронной цепочке, чтобы под ASGI не переводить
+    асинхронные представления в общий поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознает асинхронный middleware-объект.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state, token = self.enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.exit(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.exit(state, response)
+
+    def enter(self, request):
+        state = ReadState(
+            replica_enabled()
+            and request.method in SAFE_METHODS
+            and settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+        )
+        return state, _state.set(state)
+
+    def exit(self, state, response):
+        if replica_enabled() and state.wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
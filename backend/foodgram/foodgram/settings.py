@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 from dotenv import load_dotenv
 
@@ -19,18 +20,22 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'djoser',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'rest_framework',
     'django_filters',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'user.apps.UserConfig',
+    'jobs.apps.JobsConfig',
     'colorfield',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,6 +75,51 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения: включается, если задан DB_REPLICA_HOST или
+# DB_REPLICA_NAME. Для проверки на SQLite достаточно копии файла базы.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.replicas.ReplicaRouter']
+
+# Допустимое отставание реплики: столько секунд после записи клиент читает
+# с основной базы, а кэш под новой версией заполняется с нее же.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+REPLICA_STICKY_COOKIE = 'use_primary'
+
+# Кэш общий для всех процессов (web, worker, команды manage.py): через него
+# расходятся версии индексов и кэшированных ответов, списки отзыва JWT.
+# С CACHE_LOCATION (адрес memcached, в infra - сервис memcached) кэш общий;
+# без него - LocMem процесса, годится только для разработки. Таблица кэша
+# в БД не подходит: каждое обращение к версиям стало бы SQL-запросом.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', default='')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default=(
+                'django.core.cache.backends.memcached.PyMemcacheCache'
+                if CACHE_LOCATION
+                else 'django.core.cache.backends.locmem.LocMemCache'
+            )
+        ),
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+
+# Асинхронные представления чтения для запуска под ASGI (uvicorn).
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False') == 'True'
+
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', default=16))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,10 +153,20 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SHOP_LIST_PDF_FONT = os.getenv(
+    'SHOP_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+MEMBERSHIP_CACHE_SIZE = int(os.getenv('MEMBERSHIP_CACHE_SIZE', default=10000))
+
+JOBS_VISIBILITY_TIMEOUT = int(os.getenv('JOBS_VISIBILITY_TIMEOUT', default=300))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -114,3 +174,17 @@ REST_FRAMEWORK = {
 }
 
 AUTH_USER_MODEL = 'user.User'
+
+# JWT (заголовок Authorization: Bearer) - необязательная альтернатива
+# токенам djoser: запросы с ним не обращаются к базе для аутентификации.
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_MINUTES', default=5))
+    ),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_DAYS', default=1))
+    ),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
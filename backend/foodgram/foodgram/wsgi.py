@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+from recipes import indexes  # noqa: E402
+
+indexes.ingredient_index.warm_up()
+indexes.recipe_ingredient_index.warm_up()
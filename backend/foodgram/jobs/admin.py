@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        'pk',
+        'name',
+        'status',
+        'attempts',
+        'user',
+        'created_at',
+        'updated_at'
+    ]
+    list_filter = ['status', 'name']
+    raw_id_fields = ['user']
+    empty_value_display = '-пусто-'
@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from jobs.runner import claim, run
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+        parser.add_argument(
+            '--visibility-timeout',
+            type=int,
+            default=None,
+            help='Через сколько секунд незавершенная задача '
+                 'снова становится доступной.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        """ Занимает задачи по мере освобождения потоков.
+
+        Медленная задача держит только свой поток: остальные сразу
+        получают следующие задачи из очереди.
+        """
+        workers = options['workers']
+        processed = 0
+        running = {}
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='jobs'
+        ) as pool:
+            while True:
+                if len(running) < workers:
+                    for job_id in claim(
+                        workers - len(running), options['visibility_timeout']
+                    ):
+                        running[pool.submit(run, job_id)] = job_id
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, _ = wait(
+                    running,
+                    timeout=options['poll_interval'],
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    job_id = running.pop(future)
+                    processed += 1
+                    if future.exception() is not None:
+                        self.stderr.write(
+                            f'Задача {job_id}: {future.exception()!r}'
+                        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {processed}'
+        ))
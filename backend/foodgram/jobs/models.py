@@ -0,0 +1,94 @@
+from django.db import models
+from django.utils import timezone
+from foodgram.settings import AUTH_USER_MODEL
+
+User = AUTH_USER_MODEL
+
+
+class Job(models.Model):
+    """ Описание модели фоновой задачи """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name='Задача',
+        help_text='Имя зарегистрированной задачи'
+    )
+    payload = models.JSONField(
+        default=dict,
+        verbose_name='Аргументы'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Пользователь',
+        help_text='Кто может видеть статус задачи'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name='Максимум попыток'
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Не раньше'
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята до',
+        help_text='После этого времени задачу может забрать другой воркер'
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='Результат'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменена'
+    )
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'],
+                name='job_status_run_after_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
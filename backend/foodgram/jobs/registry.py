@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Job
+
+registry = {}
+
+
+def task(name, max_attempts=3):
+    """ Регистрирует функцию как фоновую задачу под именем name.
+
+    Функция получает аргументы из payload задачи; возвращаемое значение
+    сохраняется в result и должно сериализоваться в JSON.
+    """
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, user_id=None, delay=0):
+    """ Ставит задачу в очередь.
+
+    Строка задачи пишется в текущей транзакции: при ее откате задача
+    тоже не появится, а воркер не увидит ее раньше фиксации.
+    """
+    if name not in registry:
+        raise KeyError(f'Задача {name} не зарегистрирована')
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        user_id=user_id,
+        max_attempts=registry[name].max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay)
+    )
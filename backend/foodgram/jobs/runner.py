@@ -0,0 +1,94 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 10
+
+
+def claim(limit, visibility_timeout=None):
+    """ Забирает до limit готовых к выполнению задач.
+
+    Задача занимается условным UPDATE по номеру попытки, поэтому
+    несколько воркеров не выполнят одну задачу одновременно на любой
+    базе. Задача, воркер которой не уложился в visibility_timeout
+    (например, упал), снова становится доступной.
+    """
+    if visibility_timeout is None:
+        visibility_timeout = settings.JOBS_VISIBILITY_TIMEOUT
+    now = timezone.now()
+    expired = Q(status=Job.RUNNING, locked_until__lt=now)
+    Job.objects.filter(expired, attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        locked_until=None,
+        error='Превышено время выполнения',
+        updated_at=now
+    )
+    candidates = Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now) | expired
+    ).order_by('run_after', 'id').values_list('id', 'attempts')[:limit]
+    claimed = []
+    for pk, attempts in candidates:
+        if Job.objects.filter(pk=pk, attempts=attempts).filter(
+            Q(status=Job.PENDING) | Q(locked_until__lt=now)
+        ).update(
+            status=Job.RUNNING,
+            attempts=attempts + 1,
+            locked_until=now + timedelta(seconds=visibility_timeout),
+            updated_at=now
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+def run(job_id):
+    """ Выполняет занятую задачу и записывает результат или ошибку. """
+    close_old_connections()
+    try:
+        try:
+            job = Job.objects.get(pk=job_id)
+        except Job.DoesNotExist:
+            # Задачу удалили между claim и запуском.
+            logger.warning('Задача %s удалена до выполнения', job_id)
+            return
+        try:
+            func = registry[job.name]
+            result = func(**job.payload)
+        except Exception as error:
+            logger.exception('Задача %s, попытка %s', job, job.attempts)
+            fail(job, f'{type(error).__name__}: {error}')
+            return
+        Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+            status=Job.DONE,
+            result=result,
+            error='',
+            locked_until=None,
+            updated_at=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def fail(job, error):
+    """ Откладывает задачу для повтора или помечает ее упавшей. """
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        changes = {
+            'status': Job.PENDING,
+            'run_after': now + timedelta(
+                seconds=RETRY_DELAY * 2 ** (job.attempts - 1)
+            ),
+        }
+    else:
+        changes = {'status': Job.FAILED}
+    Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+        error=error, locked_until=None, updated_at=now, **changes
+    )
@@ -1,39 +1,129 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils.html import format_html
+from foodgram.paginator import EstimatedCountPaginator
+from user.models import User
 
 from .models import (Favorite, IngredientProperty, Ingredients, Recipe, Tags,
-                     UserShopCart)
+                     TagsProperty, UserShopCart)
+from .search import search_recipes
+from .utilits import change_shop_lists, recipe_amounts
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ Настройки списка для таблиц с миллионами строк. """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class AuthorFilter(admin.SimpleListFilter):
+    """ Фильтр по автору без выпадающего списка всех пользователей.
+
+    Значение подставляет ссылка в колонке автора.
+    """
+    title = 'автор'
+    parameter_name = 'author'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if value and value.isdigit():
+            user = User.objects.filter(pk=value).first()
+            if user is not None:
+                return [(value, str(user))]
+        return []
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(author_id=value)
+        return queryset
+
+
+class IngredientPropertyInline(admin.TabularInline):
+    model = IngredientProperty
+    autocomplete_fields = ['ingredient']
+    extra = 0
+    min_num = 1
+
+
+class TagsPropertyInline(admin.TabularInline):
+    model = TagsProperty
+    extra = 0
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = [
         'pk',
-        'author',
         'name',
-        'image',
-        'text',
-        'cooking_time'
+        'author_link',
+        'cooking_time',
+        'favorites_count',
+        'in_carts_count',
+        'pub_date'
     ]
-    search_fields = ['text']
+    list_select_related = ['author']
+    list_filter = ['tags', AuthorFilter]
+    search_fields = ['name']
+    autocomplete_fields = ['author']
+    readonly_fields = ['favorites_count', 'in_carts_count']
+    exclude = ['has_image_variants']
+    inlines = [IngredientPropertyInline, TagsPropertyInline]
     empty_value_display = '-пусто-'
 
+    @admin.display(description='Автор', ordering='author__username')
+    def author_link(self, obj):
+        return format_html(
+            '<a href="?{}={}">{}</a>',
+            AuthorFilter.parameter_name, obj.author_id, obj.author
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """ Поиск по полнотекстовому индексу вместо LIKE по всей таблице. """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term).order_by(
+            *queryset.query.order_by
+        ), False
+
+    @transaction.atomic
+    def save_related(self, request, form, formsets, change):
+        """ Переносит правку ингредиентов в списки покупок. """
+        old_amounts = recipe_amounts(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        new_amounts = recipe_amounts(form.instance)
+        change_shop_lists(
+            UserShopCart.objects.filter(recipe=form.instance).values_list(
+                'user_id', flat=True
+            ),
+            {
+                pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+                for pk in old_amounts.keys() | new_amounts.keys()
+            }
+        )
+
 
 @admin.register(Ingredients)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = [
         'pk',
         'name',
+        'measurement_unit'
     ]
     search_fields = ['name']
 
 
 @admin.register(IngredientProperty)
-class IngredientPropertyAdmin(admin.ModelAdmin):
+class IngredientPropertyAdmin(LargeTableAdmin):
     list_display = [
         'recipe',
         'ingredient',
         'amount'
     ]
+    list_select_related = ['recipe', 'ingredient']
+    autocomplete_fields = ['recipe', 'ingredient']
 
 
 @admin.register(Tags)
@@ -48,16 +138,20 @@ class TagsAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserShopCart)
-class ShopListAdmin(admin.ModelAdmin):
+class ShopListAdmin(LargeTableAdmin):
     list_display = [
         'user',
         'recipe'
     ]
+    list_select_related = ['user', 'recipe']
+    autocomplete_fields = ['user', 'recipe']
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = [
         'user',
         'recipe'
     ]
+    list_select_related = ['user', 'recipe']
+    autocomplete_fields = ['user', 'recipe']
@@ -0,0 +1,55 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from user.models import Follow, User
+
+from .models import Favorite, Recipe, UserShopCart
+
+# Поле-счетчик и строки, которые оно считает: (модель, поле, модель строк,
+# внешний ключ строк на модель).
+COUNTERS = [
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', UserShopCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (User, 'following_count', Follow, 'user'),
+]
+
+
+def change_counter(model, pk, field, delta):
+    """ Атомарно меняет счетчик одной строки на delta. """
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(related, foreign_key):
+    """ Подзапрос с фактическим числом строк для OuterRef('pk'). """
+    return Coalesce(
+        Subquery(
+            related.objects.filter(**{foreign_key: OuterRef('pk')}).order_by(
+            ).values(foreign_key).annotate(total=Count('*')).values('total')
+        ),
+        Value(0)
+    )
+
+
+def mismatched(model, field, related, foreign_key):
+    """ Строки model, у которых field расходится с фактическим числом. """
+    return model.objects.annotate(
+        actual=actual_count(related, foreign_key)
+    ).exclude(**{field: F('actual')})
+
+
+def reconcile(model, field, related, foreign_key):
+    """ Пересчитывает расходящиеся счетчики; возвращает их число. """
+    ids = list(
+        mismatched(model, field, related, foreign_key).values_list(
+            'pk', flat=True
+        )
+    )
+    if ids:
+        model.objects.filter(pk__in=ids).update(
+            **{field: actual_count(related, foreign_key)}
+        )
+    return len(ids)
@@ -0,0 +1,77 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image
+
+from .models import Recipe
+
+VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+
+def variant_name(name, variant, image_format):
+    """ Путь варианта рядом с оригиналом: <имя>/<вариант>.<формат>. """
+    extension = FORMATS[image_format][0]
+    return f'{os.path.splitext(name)[0]}/{variant}.{extension}'
+
+
+def variant_urls(field):
+    """ Адреса всех вариантов изображения {вариант: {формат: url}}. """
+    return {
+        variant: {
+            image_format: field.storage.url(
+                variant_name(field.name, variant, image_format)
+            )
+            for image_format in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def build_variants(field):
+    """ Сохраняет недостающие варианты изображения. """
+    storage = field.storage
+    with storage.open(field.name) as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    for variant, size in VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        for image_format, (_, options) in FORMATS.items():
+            name = variant_name(field.name, variant, image_format)
+            if storage.exists(name):
+                continue
+            result = image
+            if image_format == 'jpeg' and image.mode != 'RGB':
+                result = Image.new('RGB', image.size, 'white')
+                result.paste(image, mask=image.getchannel('A'))
+            buffer = io.BytesIO()
+            result.save(buffer, image_format.upper(), **options)
+            storage.save_exact(name, ContentFile(buffer.getvalue()))
+
+
+def process_recipe_image(recipe_id):
+    """ Строит варианты изображения рецепта и отмечает их готовность. """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None:
+        return False
+    build_variants(recipe.image)
+    with transaction.atomic():
+        if not Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=recipe.image.name
+        ).exists():
+            return False
+        recipe.has_image_variants = True
+        recipe.save(update_fields=['has_image_variants', 'updated_at'])
+    return True
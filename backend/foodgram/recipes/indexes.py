@@ -0,0 +1,396 @@
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from foodgram.replicas import primary, primary_while_recent, version_token
+
+from .models import IngredientProperty, Ingredients, Recipe
+
+CHANGE_GAP_SECONDS = 5
+CHANGE_LOG_LIMIT = 1000
+CHANGE_TIMEOUT = 24 * 60 * 60
+FUZZY_LIMIT = 20
+SIMILARITY_THRESHOLD = 0.3
+WORDS = re.compile(r'\w+')
+
+
+def normalize(value):
+    """ Приводит строку к виду для сравнения без учета регистра и ё. """
+    return value.casefold().replace('ё', 'е')
+
+
+def trigrams(value):
+    """ Триграммы слов строки по правилам pg_trgm. """
+    result = set()
+    for word in WORDS.findall(normalize(value)):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class CachedIndex:
+    """ Индекс в памяти процесса, перестраиваемый при смене версии.
+
+    Версия хранится в кэше Django: сигналы моделей меняют ее, и каждый
+    процесс перестраивает свой индекс при следующем обращении.
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+
+    def invalidate(self):
+        cache.set(self.version_key, version_token(), None)
+
+    def ensure(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = version_token()
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    with primary_while_recent(version):
+                        self.build()
+                    self.version = version
+
+    def warm_up(self):
+        """ Строит индекс при старте процесса, если база уже готова. """
+        try:
+            self.ensure()
+        except DatabaseError:
+            pass
+
+    def build(self):
+        raise NotImplementedError
+
+
+class IngredientPrefixIndex(CachedIndex):
+    """ Отсортированный список названий для поиска по префиксу. """
+
+    version_key = 'ingredient_index_version'
+
+    def __init__(self):
+        super().__init__()
+        self.data = ([], [])
+
+    def build(self):
+        rows = sorted(
+            Ingredients.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (normalize(row['name']), row['id'])
+        )
+        self.data = ([normalize(row['name']) for row in rows], rows)
+
+    def search(self, prefix='', limit=None):
+        """ Ингредиенты, название которых начинается с prefix. """
+        self.ensure()
+        keys, rows = self.data
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = len(keys) if limit is None else min(len(keys), start + limit)
+        result = []
+        for position in range(start, end):
+            if not keys[position].startswith(prefix):
+                break
+            result.append(rows[position])
+        return result
+
+
+class IngredientTrigramIndex(CachedIndex):
+    """ Инвертированный индекс триграмм для поиска с опечатками. """
+
+    version_key = IngredientPrefixIndex.version_key
+
+    def __init__(self):
+        super().__init__()
+        self.data = ([], [], [], {})
+
+    def build(self):
+        rows = list(
+            Ingredients.objects.values('id', 'name', 'measurement_unit')
+        )
+        keys = [normalize(row['name']) for row in rows]
+        sizes = []
+        postings = defaultdict(list)
+        for position, key in enumerate(keys):
+            row_trigrams = trigrams(key)
+            sizes.append(len(row_trigrams))
+            for trigram in row_trigrams:
+                postings[trigram].append(position)
+        self.data = (rows, keys, sizes, dict(postings))
+
+    def search(self, query, limit=FUZZY_LIMIT):
+        """ Совпадения по началу, затем по подстроке, затем похожие. """
+        self.ensure()
+        rows, keys, sizes, postings = self.data
+        query = normalize(query)
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        ranked = []
+        for position, count in shared.items():
+            key = keys[position]
+            similarity = count / (
+                len(query_trigrams) + sizes[position] - count
+            )
+            if key.startswith(query):
+                rank = 0
+            elif query in key:
+                rank = 1
+            elif similarity >= SIMILARITY_THRESHOLD:
+                rank = 2
+            else:
+                continue
+            ranked.append((rank, -similarity, key, position))
+        ranked.sort()
+        return [rows[item[-1]] for item in ranked[:limit]]
+
+
+class RecipeIngredientIndex(CachedIndex):
+    """ Инвертированный индекс: ингредиент -> рецепты, в которых он есть.
+
+    Рецепты пронумерованы по возрастанию id, для каждого ингредиента
+    хранится отсортированный массив номеров его рецептов (формат CSR).
+    Условия запроса сводятся к операциям над булевыми масками NumPy
+    длиной в число рецептов.
+
+    Правка рецепта не перестраивает индекс: id рецепта попадает в журнал
+    изменений в кэше Django, и каждый процесс перечитывает из базы состав
+    только этих рецептов. Целиком индекс строится при первом обращении,
+    после invalidate() и если журнал слишком отстал или потерял запись.
+    """
+
+    version_key = 'recipe_ingredient_index_version'
+    sequence_key = 'recipe_ingredient_index_sequence'
+    change_key = 'recipe_ingredient_index_change:{}'
+
+    def __init__(self):
+        super().__init__()
+        empty = np.empty(0, dtype=np.int64)
+        self.pairs = np.empty((0, 2), dtype=np.int64)
+        self.sequence = 0
+        self.gap_since = None
+        self.data = (empty, empty, np.zeros(1, dtype=np.int64), empty, empty)
+
+    def changed(self, recipe_id):
+        """ Записывает в журнал рецепт, состав которого изменился. """
+        cache.add(self.sequence_key, 0, None)
+        try:
+            sequence = cache.incr(self.sequence_key)
+        except ValueError:
+            self.invalidate()
+            return
+        cache.set(self.change_key.format(sequence), recipe_id, CHANGE_TIMEOUT)
+
+    def ensure(self):
+        super().ensure()
+        if cache.get(self.sequence_key, 0) != self.sequence:
+            with self.lock:
+                with primary():
+                    self.catch_up()
+
+    def catch_up(self):
+        """ Применяет записи журнала, которых еще нет в индексе. """
+        sequence = cache.get(self.sequence_key, 0)
+        if sequence == self.sequence:
+            return
+        if (sequence < self.sequence
+                or sequence - self.sequence > CHANGE_LOG_LIMIT):
+            self.build()
+            return
+        numbers = range(self.sequence + 1, sequence + 1)
+        found = cache.get_many(
+            [self.change_key.format(number) for number in numbers]
+        )
+        recipe_ids = set()
+        applied = self.sequence
+        for number in numbers:
+            key = self.change_key.format(number)
+            if key not in found:
+                break
+            recipe_ids.add(found[key])
+            applied = number
+        if applied == self.sequence:
+            # Номер уже выдан, а запись еще не сохранена или потеряна.
+            now = time.monotonic()
+            if self.gap_since is None:
+                self.gap_since = now
+            elif now - self.gap_since > CHANGE_GAP_SECONDS:
+                self.build()
+            return
+        self.gap_since = None
+        self.update(recipe_ids)
+        self.sequence = applied
+
+    def build(self):
+        self.sequence = cache.get(self.sequence_key, 0)
+        self.gap_since = None
+        recipes = np.fromiter(
+            Recipe.objects.order_by('id').values_list('id', flat=True),
+            dtype=np.int64
+        )
+        pairs = np.array(
+            IngredientProperty.objects.values_list(
+                'ingredient_id', 'recipe_id'
+            ),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        self.load(recipes, pairs)
+
+    def update(self, recipe_ids):
+        """ Заменяет состав рецептов recipe_ids текущим из базы. """
+        rows = list(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                'id', 'resipe_ingredient__ingredient_id'
+            )
+        )
+        changed = np.fromiter(recipe_ids, dtype=np.int64)
+        recipes = self.data[0]
+        recipes = np.union1d(
+            recipes[~np.isin(recipes, changed)],
+            np.array([recipe_id for recipe_id, _ in rows], dtype=np.int64)
+        )
+        pairs = np.array(
+            [
+                (ingredient_id, recipe_id)
+                for recipe_id, ingredient_id in rows
+                if ingredient_id is not None
+            ],
+            dtype=np.int64
+        ).reshape(-1, 2)
+        self.load(recipes, np.concatenate((
+            self.pairs[~np.isin(self.pairs[:, 1], changed)], pairs
+        )))
+
+    def load(self, recipes, pairs):
+        """ Строит CSR из пар (ингредиент, рецепт) и списка id рецептов. """
+        positions = np.searchsorted(recipes, pairs[:, 1])
+        known = positions < len(recipes)
+        known[known] = recipes[positions[known]] == pairs[known, 1]
+        pairs = np.unique(pairs[known], axis=0)
+        positions = np.searchsorted(recipes, pairs[:, 1])
+        ingredients, starts = np.unique(pairs[:, 0], return_index=True)
+        self.pairs = pairs
+        self.data = (
+            recipes,
+            ingredients,
+            np.append(starts, len(pairs)),
+            positions,
+            np.bincount(positions, minlength=len(recipes))
+        )
+
+    def postings(self, ingredient_id):
+        recipes, ingredients, offsets, positions, sizes = self.data
+        index = np.searchsorted(ingredients, ingredient_id)
+        if index == len(ingredients) or ingredients[index] != ingredient_id:
+            return positions[:0]
+        return positions[offsets[index]:offsets[index + 1]]
+
+    def match(self, include=(), exclude=(), pantry=()):
+        """ id рецептов со всеми include и без exclude и их ранги.
+
+        С pantry остаются рецепты, где есть хотя бы один продукт из
+        pantry. Ранг - номер группы рецептов с одинаковым числом
+        использованных продуктов (больше - раньше) и недостающих (меньше -
+        раньше); без pantry рангов нет (None). Возвращаются все
+        подходящие рецепты, страницу выбирает пагинация.
+        """
+        self.ensure()
+        recipes, sizes = self.data[0], self.data[4]
+        mask = np.ones(len(recipes), dtype=bool)
+        for ingredient_id in set(include):
+            required = np.zeros(len(recipes), dtype=bool)
+            required[self.postings(ingredient_id)] = True
+            mask &= required
+        for ingredient_id in set(exclude):
+            mask[self.postings(ingredient_id)] = False
+        if not pantry:
+            return recipes[mask], None
+        used = np.zeros(len(recipes), dtype=np.int64)
+        for ingredient_id in set(pantry):
+            used[self.postings(ingredient_id)] += 1
+        candidates = np.flatnonzero(mask & (used > 0))
+        used = used[candidates]
+        missing = sizes[candidates] - used
+        key = missing - used * (missing.max(initial=0) + 1)
+        ranks = np.unique(key, return_inverse=True)[1]
+        return recipes[candidates], ranks
+
+
+def id_list(ids):
+    """ Значение для id__in: список id одним параметром запроса. """
+    ids = [int(pk) for pk in ids]
+    if connection.vendor == 'postgresql':
+        return RawSQL('SELECT unnest(%s::bigint[])', [ids])
+    if connection.vendor == 'sqlite':
+        return RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)])
+    return ids
+
+
+def filter_by_ids(queryset, ids, ranks=None):
+    """ Ограничивает queryset рецептами ids.
+
+    С ranks (ранг каждого id) рецепты упорядочиваются по рангу, при
+    равном - от новых к старым. Рангов немного, и каждый проверяется
+    одним подзапросом id__in: поиск позиции каждого рецепта в полном
+    списке ids делал бы сортировку квадратичной.
+    """
+    if not len(ids):
+        return queryset.none()
+    queryset = queryset.filter(id__in=id_list(ids))
+    if ranks is None:
+        return queryset
+    groups = defaultdict(list)
+    for pk, rank in zip(ids, ranks):
+        groups[int(rank)].append(pk)
+    return queryset.annotate(ingredient_rank=Case(
+        *(When(id__in=id_list(groups[rank]), then=Value(rank))
+          for rank in sorted(groups)),
+        output_field=IntegerField()
+    )).order_by('ingredient_rank', '-id')
+
+
+def fuzzy_search(query, limit=None):
+    """ Ранжированный поиск ингредиентов с учетом опечаток.
+
+    На PostgreSQL используется pg_trgm и GIN-индексы, на остальных
+    базах - триграммный индекс в памяти процесса.
+    """
+    limit = limit or FUZZY_LIMIT
+    if len(query) < 3:
+        return ingredient_index.search(query, limit)
+    if connection.vendor != 'postgresql':
+        return trigram_index.search(query, limit)
+    return list(
+        Ingredients.objects.annotate(
+            similarity=TrigramSimilarity('name', query),
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                When(name__icontains=query, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField()
+            )
+        ).filter(
+            Q(name__icontains=query) | Q(name__trigram_similar=query)
+        ).order_by('rank', '-similarity', 'name').values(
+            'id', 'name', 'measurement_unit'
+        )[:limit]
+    )
+
+
+ingredient_index = IngredientPrefixIndex()
+trigram_index = IngredientTrigramIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
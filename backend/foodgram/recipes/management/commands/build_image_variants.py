@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from jobs.registry import enqueue
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь построение уменьшенных копий изображений '
+        'рецептов, для которых их еще нет.'
+    )
+
+    def handle(self, *args, **options):
+        recipes = list(
+            Recipe.objects.filter(has_image_variants=False).exclude(
+                image=''
+            ).values_list('id', 'author_id')
+        )
+        for recipe_id, author_id in recipes:
+            enqueue(
+                'recipes.build_image_variants',
+                {'recipe_id': recipe_id},
+                user_id=author_id
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Поставлено в очередь: {len(recipes)}. '
+            'Выполните python manage.py run_jobs.'
+        ))
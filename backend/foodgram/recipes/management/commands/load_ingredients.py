@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.indexes import ingredient_index
+from recipes.models import Ingredients
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(settings.BASE_DIR)),
+    'data', 'ingredients.csv'
+)
+NAME_LENGTH = Ingredients._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredients._meta.get_field('measurement_unit').max_length
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    """ Построчно читает CSV, заголовок name,measurement_unit необязателен. """
+    for row in csv.reader(file):
+        if row and row != ['name', 'measurement_unit']:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """ Потоково разбирает JSON-массив объектов, не загружая файл целиком. """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Файл JSON оборван или поврежден')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+class CSVStream(io.TextIOBase):
+    """ Файловый объект для COPY FROM STDIN поверх итератора строк. """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+        self.writer = csv.writer(self)
+
+    def write(self, value):
+        self.buffer += value
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        if size < 0:
+            size = len(self.buffer)
+        buffer = self.buffer
+        self.buffer = buffer[size:]
+        return buffer[:size]
+
+    readline = read
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает справочник ингредиентов из CSV или JSON. '
+        'Повторная загрузка не создает дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        reader = read_json if path.endswith('.json') else read_csv
+        before = Ingredients.objects.count()
+        self.processed = 0
+        self.skipped = 0
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = self.clean(reader(file))
+            if connection.vendor == 'postgresql' and not options['no_copy']:
+                self.copy(rows)
+            else:
+                self.bulk_create(rows, options['batch_size'])
+        elapsed = time.perf_counter() - start
+        created = Ingredients.objects.count() - before
+        if created:
+            ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {self.processed}, добавлено: {created}, '
+            f'пропущено: {self.skipped}, {elapsed:.2f} с, '
+            f'{self.processed / max(elapsed, 1e-9):.0f} строк/с'
+        ))
+
+    def clean(self, rows):
+        for name, measurement_unit in rows:
+            name = name.strip()
+            measurement_unit = measurement_unit.strip()
+            if (not name or not measurement_unit
+                    or len(name) > NAME_LENGTH
+                    or len(measurement_unit) > UNIT_LENGTH):
+                self.skipped += 1
+                continue
+            self.processed += 1
+            yield name, measurement_unit
+
+    def bulk_create(self, rows, batch_size):
+        while True:
+            batch = [
+                Ingredients(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                return
+            Ingredients.objects.bulk_create(batch, ignore_conflicts=True)
+
+    @transaction.atomic
+    def copy(self, rows):
+        """ COPY во временную таблицу и вставка с ON CONFLICT DO NOTHING. """
+        table = connection.ops.quote_name(Ingredients._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredients_load '
+                f'(name varchar({NAME_LENGTH}), '
+                f'measurement_unit varchar({UNIT_LENGTH})) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredients_load FROM STDIN WITH (FORMAT csv)',
+                CSVStream(rows)
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit FROM ingredients_load '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
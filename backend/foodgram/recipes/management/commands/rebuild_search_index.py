@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from recipes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс рецептов. Нужен после '
+        'массовой загрузки в обход сигналов моделей.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
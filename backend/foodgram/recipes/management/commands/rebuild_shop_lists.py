@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from recipes.models import IngredientProperty, ShopListItem, UserShopCart
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет сводные списки покупок с корзинами пользователей '
+        'и перестраивает расходящиеся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, ничего не изменяя.'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(UserShopCart.objects.values_list('user_id', flat=True))
+            | set(ShopListItem.objects.values_list('user_id', flat=True))
+        )
+        broken = 0
+        for user_id in user_ids:
+            expected = dict(
+                IngredientProperty.objects.filter(
+                    recipe__usershopcart__user_id=user_id
+                ).values_list('ingredient_id').annotate(total=Sum('amount'))
+            )
+            actual = dict(
+                ShopListItem.objects.filter(user_id=user_id).values_list(
+                    'ingredient_id', 'amount'
+                )
+            )
+            if expected == actual:
+                continue
+            broken += 1
+            self.stdout.write(f'Список покупок пользователя {user_id} '
+                              f'расходится с корзиной')
+            if not options['check']:
+                self.rebuild(user_id, expected)
+
+        if options['check'] and broken:
+            raise CommandError(f'Расходящихся списков: {broken}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено списков: {len(user_ids)}, '
+            f'{"расходится" if options["check"] else "перестроено"}: {broken}'
+        ))
+
+    @transaction.atomic
+    def rebuild(self, user_id, expected):
+        ShopListItem.objects.filter(user_id=user_id).delete()
+        ShopListItem.objects.bulk_create(
+            ShopListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in expected.items()
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.counters import COUNTERS, mismatched, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики избранного, корзин, рецептов и подписок '
+        'с фактическими данными и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, ничего не изменяя.'
+        )
+
+    def handle(self, *args, **options):
+        broken = 0
+        for model, field, related, foreign_key in COUNTERS:
+            if options['check']:
+                count = mismatched(model, field, related, foreign_key).count()
+            else:
+                count = reconcile(model, field, related, foreign_key)
+            if count:
+                self.stdout.write(
+                    f'{model._meta.label}.{field}: расходится у {count}'
+                )
+            broken += count
+
+        if options['check'] and broken:
+            raise CommandError(f'Расходящихся счетчиков: {broken}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Расходится" if options["check"] else "Исправлено"} '
+            f'счетчиков: {broken}'
+        ))
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from foodgram.replicas import primary_while_recent, version_token
+
+from .models import Favorite, UserShopCart
+
+Membership = namedtuple('Membership', 'version favorites cart')
+
+ANONYMOUS = Membership(None, frozenset(), frozenset())
+
+
+class MembershipCache:
+    """ Множества id рецептов в избранном и корзине пользователей.
+
+    Хранятся в памяти процесса для MEMBERSHIP_CACHE_SIZE последних
+    пользователей (LRU). Изменения избранного и корзины записываются
+    сюда сразу и меняют версию пользователя в кэше Django, по которой
+    остальные процессы перечитывают свои копии.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def version_key(user_id):
+        return f'membership_version:{user_id}'
+
+    def get_version(self, user_id):
+        key = self.version_key(user_id)
+        version = cache.get(key)
+        if version is not None:
+            return version
+        version = version_token()
+        if cache.add(key, version, None):
+            return version
+        return cache.get(key)
+
+    def get(self, user):
+        """ Избранное и корзина пользователя; для анонима пустые. """
+        if user is None or not user.is_authenticated:
+            return ANONYMOUS
+        version = self.get_version(user.pk)
+        with self.lock:
+            entry = self.entries.get(user.pk)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(user.pk)
+                return entry
+        with primary_while_recent(version):
+            entry = Membership(
+                version,
+                frozenset(Favorite.objects.filter(
+                    user_id=user.pk
+                ).values_list('recipe_id', flat=True)),
+                frozenset(UserShopCart.objects.filter(
+                    user_id=user.pk
+                ).values_list('recipe_id', flat=True))
+            )
+        self.store(user.pk, entry)
+        return entry
+
+    def store(self, user_id, entry):
+        with self.lock:
+            self.entries[user_id] = entry
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.MEMBERSHIP_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def change(self, user_id, field, recipe_id, present):
+        """ Добавляет или убирает рецепт из множества field пользователя. """
+        current = self.get_version(user_id)
+        version = version_token()
+        cache.set(self.version_key(user_id), version, None)
+        with self.lock:
+            entry = self.entries.pop(user_id, None)
+        if entry is None or entry.version != current:
+            return
+        recipes = getattr(entry, field)
+        recipes = recipes | {recipe_id} if present else recipes - {recipe_id}
+        self.store(user_id, entry._replace(version=version, **{
+            field: recipes
+        }))
+
+
+membership = MembershipCache()
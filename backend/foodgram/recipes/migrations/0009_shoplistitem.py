@@ -0,0 +1,57 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shop_lists(apps, schema_editor):
+    IngredientProperty = apps.get_model('recipes', 'IngredientProperty')
+    ShopListItem = apps.get_model('recipes', 'ShopListItem')
+    totals = IngredientProperty.objects.filter(
+        recipe__usershopcart__isnull=False
+    ).values_list(
+        'recipe__usershopcart__user_id', 'ingredient_id'
+    ).annotate(total=models.Sum('amount')).order_by()
+    ShopListItem.objects.bulk_create(
+        (
+            ShopListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         amount=total)
+            for user_id, ingredient_id, total in totals.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_alter_recipe_options_alter_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(upload_to='recipes/images/', verbose_name='Изображение'),
+        ),
+        migrations.CreateModel(
+            name='ShopListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, help_text='Суммарное количество ингредиента', verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(help_text='Ингредиент из списка покупок', on_delete=django.db.models.deletion.CASCADE, related_name='shop_list_items', to='recipes.ingredients', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(help_text='Владелец списка покупок', on_delete=django.db.models.deletion.CASCADE, related_name='shop_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Сводные списки покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoplistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shop_list_item'),
+        ),
+        migrations.RunPython(fill_shop_lists, migrations.RunPython.noop),
+    ]
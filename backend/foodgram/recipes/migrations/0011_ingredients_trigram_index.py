@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ingredients_name_trgm '
+    'ON recipes_ingredients USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ingredients_name_upper_trgm '
+    'ON recipes_ingredients USING gin (UPPER(name::text) gin_trgm_ops)',
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for sql in TRIGRAM_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS ingredients_name_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS ingredients_name_upper_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_ingredients_unique_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:23
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = [
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count',
+     'recipes', 'UserShopCart', 'recipe'),
+    ('user', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('user', 'User', 'followers_count', 'user', 'Follow', 'author'),
+    ('user', 'User', 'following_count', 'user', 'Follow', 'user'),
+]
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, related_app, related_name, foreign_key in COUNTERS:
+        related = apps.get_model(related_app, related_name)
+        apps.get_model(app, name).objects.update(**{field: Coalesce(
+            models.Subquery(
+                related.objects.filter(
+                    **{foreign_key: models.OuterRef('pk')}
+                ).order_by().values(foreign_key).annotate(
+                    total=models.Count('*')
+                ).values('total')
+            ),
+            models.Value(0)
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_image_variants'),
+        ('user', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
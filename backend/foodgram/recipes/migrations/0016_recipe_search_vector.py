@@ -0,0 +1,53 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            'UPDATE recipes_recipe SET search_vector = '
+            "setweight(to_tsvector('russian', COALESCE(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', COALESCE(text, '')), 'B')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+            'USING fts5(name, text, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+            "SELECT id, REPLACE(REPLACE(name, 'ё', 'е'), 'Ё', 'Е'), "
+            "REPLACE(REPLACE(text, 'ё', 'е'), 'Ё', 'Е') FROM recipes_recipe"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name='Поисковый индекс'
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
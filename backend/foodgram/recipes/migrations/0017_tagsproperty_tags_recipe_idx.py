@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tagsproperty',
+            index=models.Index(fields=['tags', 'recipe'], name='tagsproperty_tags_recipe_idx'),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import Prefetch, UniqueConstraint
 from foodgram.common import COLOR_CHOICES, TAG_CHOICES
 from foodgram.settings import AUTH_USER_MODEL
 
+from .storage import ContentHashStorage
+
 User = AUTH_USER_MODEL
 
 
@@ -28,6 +31,12 @@ class Ingredients(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -69,6 +78,58 @@ class Tags(models.Model):
         return super().save(*args, **kwargs)
 
 
+def recipe_prefetches():
+    """ Связи рецепта, которые загружаются для сериализации. """
+    return [
+        'tags',
+        Prefetch(
+            'resipe_ingredient',
+            queryset=IngredientProperty.objects.select_related('ingredient')
+        ),
+    ]
+
+
+class RecipeQuerySet(models.QuerySet):
+    """ QuerySet рецептов с предзагрузкой связанных данных """
+
+    def with_related(self):
+        """ Рецепты со всеми данными для сериализации одним набором запросов.
+
+        Автор присоединяется через JOIN, теги и ингредиенты загружаются
+        prefetch-запросами. Флаги избранного и корзины берутся из
+        recipes.membership без запросов к базе. Поисковый вектор не
+        загружается: он нужен только в условиях запроса.
+        """
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(*recipe_prefetches())
+
+    def latest_by_authors(self, author_ids, limit=None):
+        """ Последние limit рецептов каждого автора одним запросом.
+
+        Рецепты нумеруются оконной функцией ROW_NUMBER() внутри автора.
+        """
+        if not author_ids:
+            return []
+        if limit is None:
+            return self.filter(author_id__in=author_ids).order_by(
+                'author_id', '-pub_date', '-id'
+            )
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        return self.raw(
+            'SELECT id, author_id, name, image, has_image_variants, '
+            'cooking_time FROM (SELECT id, author_id, name, image, '
+            'has_image_variants, cooking_time, '
+            'ROW_NUMBER() OVER (PARTITION BY author_id '
+            'ORDER BY pub_date DESC, id DESC) AS position '
+            f'FROM {self.model._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})'
+            ') AS ranked WHERE position <= %s '
+            'ORDER BY author_id, position',
+            [*author_ids, limit]
+        )
+
+
 class Recipe(models.Model):
     """ Описание модели Recipe """
 
@@ -88,8 +149,27 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=ContentHashStorage(),
         verbose_name='Изображение',
     )
+    has_image_variants = models.BooleanField(
+        default=False,
+        verbose_name='Уменьшенные копии готовы'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В корзинах'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый индекс'
+    )
     text = models.CharField(
         max_length=1000,
         blank=False,
@@ -126,10 +206,23 @@ class Recipe(models.Model):
         verbose_name='Дата создания рецепта'
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения рецепта'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепты'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            )
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'author'],
@@ -140,6 +233,14 @@ class Recipe(models.Model):
     def __str__(self):
         return f'{self.name}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Запоминает автора из базы, чтобы при его смене перенести
+        счетчик рецептов (recipes.signals.count_author_recipes). """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_author_id = instance.__dict__.get('author_id')
+        return instance
+
 
 class IngredientProperty(models.Model):
     """ Описание модели свойства ингредиента """
@@ -190,6 +291,12 @@ class TagsProperty(models.Model):
     class Meta:
         verbose_name = 'Свойство тега'
         verbose_name_plural = 'Свойства тега'
+        indexes = [
+            models.Index(
+                fields=['tags', 'recipe'],
+                name='tagsproperty_tags_recipe_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.tags}'
@@ -259,3 +366,40 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user} добавил в список избранных рецептов {self.recipe}"
+
+
+class ShopListItem(models.Model):
+    """ Сводный список покупок пользователя """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shop_list',
+        verbose_name='Пользователь',
+        help_text='Владелец списка покупок'
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name='shop_list_items',
+        verbose_name='Ингредиент',
+        help_text='Ингредиент из списка покупок'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество',
+        help_text='Суммарное количество ингредиента'
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shop_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount}'
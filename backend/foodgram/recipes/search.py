@@ -0,0 +1,93 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F
+
+from .models import Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+WORDS = re.compile(r'\w+')
+# FTS5 не отождествляет е и ё, поэтому обе стороны приводятся к е.
+FOLD_YO = "REPLACE(REPLACE({}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fold_yo(value):
+    return value.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def search_vector():
+    """ Название весит больше описания. """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def index_recipe(recipe):
+    """ Обновляет поисковый индекс рецепта после сохранения. """
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk=recipe.pk).update(
+            search_vector=search_vector()
+        )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                [recipe.pk, fold_yo(recipe.name), fold_yo(recipe.text)]
+            )
+
+
+def unindex_recipe(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def rebuild_search_index():
+    """ Перестраивает индекс целиком, например после bulk_create. """
+    if connection.vendor == 'postgresql':
+        Recipe.objects.update(search_vector=search_vector())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, {FOLD_YO.format("name")}, '
+                f'{FOLD_YO.format("text")} FROM {Recipe._meta.db_table}'
+            )
+
+
+def search_recipes(queryset, query):
+    """ Рецепты, подходящие под запрос, от самых релевантных.
+
+    На PostgreSQL используется tsvector с русской морфологией и
+    GIN-индексом, на SQLite - таблица FTS5 с поиском по началу слов.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+    words = WORDS.findall(fold_yo(query))
+    if not words:
+        return queryset.none()
+    match = ' '.join(f'"{word}"*' for word in words)
+    # MATCH выполняется один раз: рецепты соединяются с его результатом,
+    # а bm25 считается для уже найденных строк.
+    return queryset.extra(
+        select={'rank': f'-bm25({FTS_TABLE}, 10.0, 1.0)'},
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = {Recipe._meta.db_table}.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[match]
+    ).order_by('-rank', '-pub_date', '-id')
@@ -0,0 +1,197 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+from jobs.registry import enqueue
+from user.models import User
+
+from .counters import change_counter
+from .indexes import ingredient_index, recipe_ingredient_index
+from .membership import membership
+from .models import (Favorite, IngredientProperty, Ingredients, Recipe,
+                     TagsProperty, UserShopCart)
+from .search import index_recipe, unindex_recipe
+from .utilits import change_shop_lists, recipe_amounts
+
+
+@receiver(post_save, sender=UserShopCart)
+def add_to_shop_list(sender, instance, created, **kwargs):
+    """ Добавляет ингредиенты рецепта в сводный список покупок. """
+    if created:
+        change_shop_lists(
+            [instance.user_id], recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=UserShopCart)
+def remove_from_shop_list(sender, instance, **kwargs):
+    """ Вычитает ингредиенты рецепта из сводного списка покупок.
+
+    pre_delete срабатывает до каскадного удаления ингредиентов рецепта,
+    поэтому их количество еще доступно.
+    """
+    change_shop_lists(
+        [instance.user_id],
+        {
+            pk: -amount
+            for pk, amount in recipe_amounts(instance.recipe_id).items()
+        }
+    )
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def invalidate_ingredient_index(sender, **kwargs):
+    """ Перестраивает индексы ингредиентов во всех процессах. """
+    ingredient_index.invalidate()
+
+
+def recipe_ingredients_changed(recipe_ids):
+    """ Обновляет индекс ингредиентов рецептов после фиксации. """
+    for recipe_id in set(recipe_ids):
+        transaction.on_commit(
+            partial(recipe_ingredient_index.changed, recipe_id)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_ingredient_index(sender, instance, update_fields=None,
+                                   **kwargs):
+    """ Новый, измененный или удаленный рецепт.
+
+    Сериализатор меняет состав рецепта через bulk-операции без сигналов,
+    но всегда сохраняет сам рецепт целиком.
+    """
+    if update_fields is None:
+        recipe_ingredients_changed([instance.pk])
+
+
+@receiver(post_save, sender=IngredientProperty)
+@receiver(post_delete, sender=IngredientProperty)
+def update_recipe_ingredient_index_on_row(sender, instance, **kwargs):
+    recipe_ingredients_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_ingredient_index_on_relations(sender, instance, action,
+                                                reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ingredients_changed([instance.pk])
+    elif pk_set is not None:
+        recipe_ingredients_changed(pk_set)
+    else:
+        # clear() со стороны ингредиента: затронутые рецепты неизвестны.
+        transaction.on_commit(recipe_ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=IngredientProperty)
+@receiver(post_save, sender=TagsProperty)
+def touch_recipe(sender, instance, **kwargs):
+    """ Обновляет дату изменения рецепта при правке его состава. """
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_relations(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """ То же для add/remove/set/clear через связи рецепта. """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    recipe_ids = (pk_set or ()) if reverse else [instance.pk]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_variants(sender, instance, **kwargs):
+    """ Для нового изображения копии строятся заново. """
+    if instance.image and not instance.image._committed:
+        instance.has_image_variants = False
+
+
+@receiver(post_save, sender=Recipe)
+def process_image(sender, instance, created, update_fields, **kwargs):
+    """ Ставит в очередь построение уменьшенных копий изображения. """
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if not instance.has_image_variants:
+        enqueue(
+            'recipes.build_image_variants',
+            {'recipe_id': instance.pk},
+            user_id=instance.author_id
+        )
+
+
+def change_membership(instance, field, present):
+    transaction.on_commit(lambda: membership.change(
+        instance.user_id, field, instance.recipe_id, present
+    ))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=UserShopCart)
+def add_membership(sender, instance, created, **kwargs):
+    """ Сразу отражает добавление в избранное и корзину в кэше. """
+    if created:
+        field = 'favorites' if sender is Favorite else 'cart'
+        change_membership(instance, field, True)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=UserShopCart)
+def remove_membership(sender, instance, **kwargs):
+    field = 'favorites' if sender is Favorite else 'cart'
+    change_membership(instance, field, False)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=UserShopCart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=UserShopCart)
+def count_recipe_marks(sender, instance, created=False, **kwargs):
+    """ Счетчики избранного и корзин рецепта. """
+    if kwargs['signal'] is post_save and not created:
+        return
+    field = 'favorites_count' if sender is Favorite else 'in_carts_count'
+    change_counter(
+        Recipe, instance.recipe_id, field, 1 if created else -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def count_author_recipes(sender, instance, created=False, **kwargs):
+    """ Счетчик рецептов автора; при смене автора рецепт переносится. """
+    if kwargs['signal'] is post_delete:
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+        return
+    previous = getattr(instance, 'loaded_author_id', None)
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+    elif previous is not None and previous != instance.author_id:
+        change_counter(User, previous, 'recipes_count', -1)
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+    instance.loaded_author_id = instance.author_id
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, update_fields, **kwargs):
+    """ Поисковый индекс следует за названием и описанием рецепта. """
+    if update_fields is not None and not {'name', 'text'} & update_fields:
+        return
+    index_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_recipe(instance.pk)
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """ Хранит файл под SHA-256 его содержимого.
+
+    Одинаковые изображения, загруженные разными рецептами, занимают
+    на диске одно место: повторная запись существующего файла пропускается.
+    Производные файлы (уменьшенные копии) сохраняются через save_exact
+    под именами, построенными от хэша оригинала.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        return self.save_exact(name, content)
+
+    def save_exact(self, name, content):
+        """ Сохраняет файл под заданным именем, если его еще нет. """
+        if self.exists(name):
+            return name
+        return super().save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым: файл с тем же именем - тот же файл.
+        return name
+
+    def _save(self, name, content):
+        """ Пишет во временный файл и атомарно переименовывает.
+
+        Параллельная запись одного и того же содержимого безопасна.
+        """
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, full_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        return name
@@ -0,0 +1,8 @@
+from jobs.registry import task
+
+from .images import process_recipe_image
+
+
+@task('recipes.build_image_variants')
+def build_image_variants(recipe_id):
+    return {'ready': process_recipe_image(recipe_id)}
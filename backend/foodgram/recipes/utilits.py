@@ -1,3 +1,11 @@
+import csv
+import io
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import IngredientProperty, ShopListItem
+
 TRANS_DICT = {
     'ingredient__name': 'Название ингредиента',
     'ingredient__measurement_unit': 'единица измерения',
@@ -5,15 +13,107 @@ TRANS_DICT = {
 }
 
 
-def make_send_file(ingredient):
-    with open('shop_list_file.txt', 'w') as shop_list_file:
-        shop_list_file.write('Список ингредиентов:\n\n')
-        for i in ingredient:
-            for key, value in i.items():
-                shop_list_file.write(f'{TRANS_DICT[key]} - {value}\n')
-                if key == 'amount':
-                    shop_list_file.write('\n')
+class Echo:
+    """ Псевдо-файл для csv.writer: возвращает строку вместо записи. """
+
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredient):
+    yield 'Список ингредиентов:\n\n'
+    for i in ingredient:
+        yield ''.join(
+            f'{TRANS_DICT[key]} - {i[key]}\n' for key in TRANS_DICT
+        ) + '\n'
+
+
+def render_csv(ingredient):
+    writer = csv.writer(Echo())
+    yield writer.writerow(TRANS_DICT.values())
+    for i in ingredient:
+        yield writer.writerow(i[key] for key in TRANS_DICT)
+
+
+def render_pdf(ingredient):
+    """ PDF собирается целиком: формат не допускает потоковую запись. """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont('ShopList', settings.SHOP_LIST_PDF_FONT))
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - 50
+    page.setFont('ShopList', 16)
+    page.drawString(50, y, 'Список ингредиентов:')
+    page.setFont('ShopList', 12)
+    for i in ingredient:
+        y -= 20
+        if y < 50:
+            page.showPage()
+            page.setFont('ShopList', 12)
+            y = height - 50
+        page.drawString(
+            50, y,
+            f'{i["ingredient__name"]} '
+            f'({i["ingredient__measurement_unit"]}) - {i["amount"]}'
+        )
+    page.save()
+    yield buffer.getvalue()
+
+
+SHOP_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'pdf': ('application/pdf', render_pdf),
+}
+
+
+def make_send_file(ingredient, file_type='txt'):
+    """ Возвращает content-type и генератор частей файла списка покупок. """
+    content_type, renderer = SHOP_LIST_FORMATS[file_type]
+    return content_type, renderer(ingredient)
+
+
+def recipe_amounts(recipe):
+    """ Количество каждого ингредиента рецепта: {ingredient_id: amount}. """
+    return dict(
+        IngredientProperty.objects.filter(recipe=recipe).values_list(
+            'ingredient_id', 'amount'
+        )
+    )
+
+
+def change_shop_lists(user_ids, deltas):
+    """ Прибавляет deltas {ingredient_id: amount} к спискам покупок.
 
-    with open('shop_list_file.txt', 'r') as f:
-        file_data = f.read()
-    return file_data
+    Недостающие позиции создаются, обнуленные удаляются; все
+    изменения выполняются тремя запросами независимо от размера рецепта.
+    """
+    deltas = {pk: amount for pk, amount in deltas.items() if amount}
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    ShopListItem.objects.bulk_create(
+        [
+            ShopListItem(user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in user_ids
+            for ingredient_id in deltas
+        ],
+        ignore_conflicts=True
+    )
+    items = ShopListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    items.update(amount=F('amount') + Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(amount))
+            for ingredient_id, amount in deltas.items()
+        ),
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    items.filter(amount__lte=0).delete()
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from foodgram.paginator import EstimatedCountPaginator
 
 from .models import Follow, User
 
@@ -14,11 +15,20 @@ class UserAdmin(admin.ModelAdmin):
         'is_active',
         'last_name',
         'is_subscribed',
+        'recipes_count',
+        'followers_count',
     ]
-    search_fields = ['email']
+    search_fields = ['email', 'username']
+    readonly_fields = ['recipes_count', 'followers_count', 'following_count']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ['user', 'author']
+    list_select_related = ['user', 'author']
+    autocomplete_fields = ['user', 'author']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
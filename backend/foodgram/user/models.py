@@ -80,6 +80,20 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     updated_at = models.DateTimeField(auto_now=True)
 
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
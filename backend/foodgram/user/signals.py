@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.counters import change_counter
+
+from .models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_follows(sender, instance, created=False, **kwargs):
+    """ Счетчики подписчиков автора и подписок пользователя. """
+    if kwargs['signal'] is post_save and not created:
+        return
+    delta = 1 if created else -1
+    change_counter(User, instance.author_id, 'followers_count', delta)
+    change_counter(User, instance.user_id, 'following_count', delta)